@@ -1,104 +1,315 @@
-#TODO class to delete QR
 import fitz
 
-import io
+import hashlib
 
-import re
+import os
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.colors import red, black
+import sqlite3
 
-import tempfile
+import threading
 
-from PIL import Image
+from contextlib import contextmanager
 
+from .metrics import METRICS
+from .watermarks import Overlay, stamp
 
+QR_WATERMARK = Overlay((70, 100, 250, 75), ("QR art. 113",))
 
-class DeleteQR:
-    def __init__(self, pdf_path, output_path):
-        self.pdf_path = pdf_path
-        self.output_path = output_path
+# Resultados de la detección por imagen, compartidos entre procesos y corridas
+QR_CACHE_PATH = os.path.abspath('app/cache/qr_codes.sqlite3')
 
-    def FindQRCoordinates(self):
-        pdf_document = fitz.open(self.pdf_path)
-        pages_data = []
+# Imágenes candidatas: casi cuadradas, de 1 a ~10 cm colocadas en la página y de al menos 21 pixeles
+# (un QR versión 1 tiene 21x21 módulos); el resto nunca se decodifica
+QR_MIN_POINTS = 28
+QR_MAX_POINTS = 300
+QR_MAX_ASPECT = 1.3
+QR_MIN_PIXELS = 21
+
+# Lado máximo (pixeles) con el que se pasa cada candidata al detector
+DECODE_MAX_SIDE = 600
+
+
+def _rounded(rect):
+    return tuple(round(coord) for coord in rect)
+
+
+def _raw_digest(doc, xref, digests):
+    # Hash del stream tal como está guardado (comprimido): identifica la misma imagen sin decodificarla
+    digest = digests.get(xref)
+    if digest is None:
+        digest = digests[xref] = hashlib.sha1(doc.xref_stream_raw(xref)).digest()
+    return digest
+
+
+def find_qr_images(doc, page_num=None):
+    """
+    Imágenes de la página `page_num` (por omisión la última) que no aparecen
+    en ninguna página anterior: ni el mismo xref, ni el mismo contenido, ni en
+    la misma posición. Regresa tuplas (xref, Rect).
+
+    Solo se usan metadatos, nunca se decodifican pixeles: la lista de imágenes
+    de cada página viene de sus recursos, el contenido se compara con el hash
+    del stream comprimido (solo entre imágenes de las mismas dimensiones) y las
+    posiciones salen de recorrer el contenido de las páginas que tienen
+    imágenes. Cada filtro corre solo si quedan candidatas del anterior.
+    """
+    if page_num is None:
+        page_num = len(doc) - 1
+    page = doc[page_num]
+
+    # Las imágenes que se dibujan dentro de un Form XObject (item[-1] != 0) son de plantilla; se dejan
+    candidates = [item for item in page.get_images(full=True) if item[-1] == 0]
+    if not candidates:
+        return []
+
+    earlier_xrefs = set()
+    earlier_by_size = {}
+    earlier_images = {}
+    for earlier in range(page_num):
+        items = doc.get_page_images(earlier, full=True)
+        if items:
+            earlier_images[earlier] = items
+        for item in items:
+            earlier_xrefs.add(item[0])
+            earlier_by_size.setdefault((item[2], item[3]), set()).add(item[0])
+
+    candidates = [item for item in candidates if item[0] not in earlier_xrefs]
+
+    digests = {}
+    unique = []
+    for item in candidates:
+        same_size = earlier_by_size.get((item[2], item[3]), ())
+        digest = _raw_digest(doc, item[0], digests)
+        if not any(_raw_digest(doc, xref, digests) == digest for xref in same_size):
+            unique.append(item)
+
+    located = []
+    for item in unique:
+        rect = page.get_image_bbox(item)
+        if rect.is_valid and not rect.is_empty and not rect.is_infinite:
+            located.append((item[0], rect))
+    if not located:
+        return []
+
+    # Solo las páginas que tienen imágenes en sus recursos pueden tener una en la misma posición
+    earlier_positions = set()
+    for earlier, items in earlier_images.items():
+        for item in items:
+            if item[-1] == 0:
+                earlier_positions.add(_rounded(doc[earlier].get_image_bbox(item)))
+
+    return [(xref, rect) for xref, rect in located if _rounded(rect) not in earlier_positions]
+
+
+def remove_qr_images(doc, page_num=None):
+    """
+    Quita de la página las imágenes que encuentra find_qr_images: la imagen se
+    reemplaza en el archivo (no solo se tapa) y en su lugar queda un rectángulo
+    negro. Regresa cuántas se quitaron.
+    """
+    if page_num is None:
+        page_num = len(doc) - 1
+    page = doc[page_num]
+
+    with METRICS.stage('qr'):
+        found = find_qr_images(doc, page_num)
+        for xref, rect in found:
+            page.delete_image(xref)
+            page.draw_rect(rect, color=(0, 0, 0), width=2, fill=(0, 0, 0))
+
+    METRICS.inc('qr_removed_total', len(found))
+    return len(found)
+
+
+def _looks_square(width, height):
+    return min(width, height) > 0 and max(width, height) / min(width, height) <= QR_MAX_ASPECT
 
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            images = page.get_images(full=True)
 
-            page_data = {'images': []}
+def _candidate_placements(doc, pages):
+    """ {xref: [(página, Rect)]} de las imágenes que por tamaño y proporción podrían ser un QR. """
+    placements = {}
+    for page_num in pages:
+        page = doc[page_num]
+        for item in page.get_images(full=True):
+            xref, width, height = item[0], item[2], item[3]
+            if item[-1] != 0 or min(width, height) < QR_MIN_PIXELS or not _looks_square(width, height):
+                continue
 
-            for img_index, img in enumerate(images):
-                xref = img[0]
-                base_image = pdf_document.extract_image(xref)
-                image_bytes = base_image["image"]
+            rect = page.get_image_bbox(item)
+            if rect.is_infinite or rect.is_empty or not _looks_square(rect.width, rect.height):
+                continue
+            if QR_MIN_POINTS <= min(rect.width, rect.height) and max(rect.width, rect.height) <= QR_MAX_POINTS:
+                placements.setdefault(xref, []).append((page_num, rect))
+    return placements
 
-                image = Image.open(io.BytesIO(image_bytes))
 
-                img_rect = page.get_image_rects(xref)[0]
-                coords = (img_rect.x0, img_rect.y0, img_rect.x1, img_rect.y1)
+def _downscaled(doc, xref):
+    """ La imagen en escala de grises, reducida a la mitad las veces necesarias para no pasar de DECODE_MAX_SIDE. """
+    from PIL import Image
 
-                page_data['images'].append({'image': image, 'coords': coords})
+    pix = fitz.Pixmap(doc, xref)
+    if pix.colorspace is None or pix.colorspace.n != 1 or pix.alpha:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    factor = 0
+    while max(pix.width, pix.height) >> factor > DECODE_MAX_SIDE:
+        factor += 1
+    if factor:
+        pix.shrink(factor)
+    return Image.frombytes('L', (pix.width, pix.height), pix.samples)
 
-            pages_data.append(page_data)
 
-        for i, page_data in enumerate(pages_data):
-            for img_data in page_data['images']:
-                rounded_coords = tuple(round(coord) for coord in img_data["coords"])
+def _pyzbar_detector():
+    from pyzbar.pyzbar import decode, ZBarSymbol
 
-        final_page = len(pages_data) - 1
-        last_page_coordinates = {tuple(round(coord) for coord in img_data['coords']) 
-                                 for img_data in pages_data[final_page]['images']}
+    return lambda image: bool(decode(image, symbols=[ZBarSymbol.QRCODE]))
 
-        previous_coordinates = set()
-        for page in range(final_page):
-            previous_coordinates.update(tuple(round(coord) for coord in img_data['coords']) 
-                                        for img_data in pages_data[page]['images'])
 
-        different_coordinates = last_page_coordinates - previous_coordinates
+def _qreader_detector():
+    import numpy
+    from qreader import QReader
 
-        for coords in different_coordinates:
-            rect_coords = list(coords)  
-            rect_color = (0, 0, 0)  
-            fill_color = (0, 0, 0)  
-            page = pdf_document[final_page]
-            page.draw_rect(rect_coords, color=rect_color, width=2, fill=fill_color)
+    reader = QReader()
+    return lambda image: bool(reader.detect(image=numpy.asarray(image.convert('RGB'))))
 
-        pdf_document.save(self.output_path)
-        self.AddQrWatermark()
-        pdf_document.close()
 
-    def AddQrWatermark(self):
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
+# Detectores disponibles; se importan (y qreader carga su modelo) la primera vez que se usan en el proceso
+DETECTORS = {'pyzbar': _pyzbar_detector, 'qreader': _qreader_detector}
+_detectors = {}
 
-        text = "QR art. 113"
-        rect_x, rect_y, rect_width, rect_height = 70, 100, 250, 75
 
-        can.setFillColor((0, 0, 0))  
-        can.rect(rect_x, rect_y, rect_width, rect_height, fill=True, stroke=False)
+def load_detector(name):
+    detector = _detectors.get(name)
+    if detector is None:
+        if name not in DETECTORS:
+            raise ValueError(f'Detector de QR desconocido: {name}')
+        try:
+            detector = _detectors[name] = DETECTORS[name]()
+        except ImportError as e:
+            raise RuntimeError(f'El detector de QR {name} no está instalado: {e}')
+    return detector
 
-        text_object = can.beginText()
-        text_object.setTextOrigin(rect_x + 5, rect_y + rect_height - 15)
-        text_object.setFont("Helvetica", 9)
-        can.setFillColor((1, 0, 0)) 
 
-        text_object.textLine(text)
-        can.drawText(text_object)
-        can.save()
+class QRCache:
+    """
+    Si una imagen es QR, por digest de su stream y por detector.
 
-        packet.seek(0)
+    Los mismos QR y sellos aparecen en miles de resoluciones: se detectan una
+    vez y después se consultan aquí, en memoria dentro del proceso y en SQLite
+    entre procesos (los del pool viven solo lo que dura un lote) y corridas.
+    """
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(packet.getvalue())
-            temp_pdf_path = temp_file.name
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._memory = {}
+        self._lock = threading.Lock()
 
-        doc = fitz.open(self.output_path) 
-        page = doc[-1] 
-        new_pdf = fitz.open(temp_pdf_path)
-        page.show_pdf_page(page.rect, new_pdf, 0)
-        
-        doc.saveIncr()
-        doc.close()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS qr_images '
+                         '(digest TEXT NOT NULL, detector TEXT NOT NULL, is_qr INTEGER NOT NULL, '
+                         'PRIMARY KEY (digest, detector))')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, digests, detector):
+        with self._lock:
+            found = {digest: self._memory[digest, detector] for digest in digests if (digest, detector) in self._memory}
+        missing = [digest for digest in digests if digest not in found]
+        if missing:
+            with self._connect() as conn:
+                placeholders = ', '.join('?' * len(missing))
+                rows = conn.execute(f'SELECT digest, is_qr FROM qr_images WHERE detector = ? AND digest IN ({placeholders})',
+                                    (detector, *missing)).fetchall()
+            with self._lock:
+                for digest, is_qr in rows:
+                    found[digest] = self._memory[digest, detector] = bool(is_qr)
+        return found
+
+    def put_many(self, results, detector):
+        with self._lock:
+            for digest, is_qr in results.items():
+                self._memory[digest, detector] = is_qr
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO qr_images (digest, detector, is_qr) VALUES (?, ?, ?)',
+                             [(digest, detector, int(is_qr)) for digest, is_qr in results.items()])
+
+
+_qr_cache = None
+
+
+def get_qr_cache():
+    global _qr_cache
+    if _qr_cache is None or _qr_cache.db_path != QR_CACHE_PATH:
+        _qr_cache = QRCache(QR_CACHE_PATH)
+    return _qr_cache
+
+
+def find_qr_codes(doc, pages, detector):
+    """
+    Imágenes QR en `pages` según el detector ('pyzbar' o 'qreader'). Regresa
+    {xref: [(página, Rect)]} con todas sus colocaciones.
+
+    Solo se decodifican las candidatas por tamaño y proporción, una vez por
+    imagen distinta del documento (por digest, aunque se repita en muchas
+    páginas o con varios xref) y solo si la caché no la conoce; se juntan todas
+    las del documento antes de cargar el detector.
+    """
+    placements = _candidate_placements(doc, pages)
+    if not placements:
+        return {}
+
+    hashes = {}
+    digests = {xref: _raw_digest(doc, xref, hashes).hex() for xref in placements}
+    cache = get_qr_cache()
+    known = cache.get_many(set(digests.values()), detector)
+
+    pending = {}
+    for xref, digest in digests.items():
+        if digest not in known:
+            pending.setdefault(digest, xref)
+    METRICS.inc('qr_cache_hits_total', len(set(digests.values())) - len(pending))
+
+    if pending:
+        decode = load_detector(detector)
+        with METRICS.stage('qr_decode'):
+            results = {digest: decode(_downscaled(doc, xref)) for digest, xref in pending.items()}
+        METRICS.inc('qr_decoded_total', len(results))
+        cache.put_many(results, detector)
+        known.update(results)
+
+    return {xref: placed for xref, placed in placements.items() if known[digests[xref]]}
+
+
+def remove_qr_codes(doc, pages, detector):
+    """ Quita (igual que remove_qr_images) los QR que encuentra find_qr_codes; regresa las páginas donde había. """
+    with METRICS.stage('qr'):
+        found = find_qr_codes(doc, pages, detector)
+        for xref, placed in found.items():
+            doc[placed[0][0]].delete_image(xref)
+            for page_num, rect in placed:
+                doc[page_num].draw_rect(rect, color=(0, 0, 0), width=2, fill=(0, 0, 0))
+
+    METRICS.inc('qr_removed_total', len(found))
+    return sorted({page_num for placed in found.values() for page_num, _ in placed})
+
+
+class DeleteQR:
+    """ Quita los QR de la última página de un PDF suelto y le pone la leyenda; los procesadores usan remove_qr_images. """
+
+    def __init__(self, pdf_path, output_path):
+        self.pdf_path = pdf_path
+        self.output_path = output_path
+
+    def FindQRCoordinates(self):
+        with fitz.open(self.pdf_path) as pdf_document:
+            if remove_qr_images(pdf_document):
+                stamp(pdf_document[-1], QR_WATERMARK)
+            pdf_document.save(self.output_path)
@@ -1,5 +1,2 @@
-from flask import Blueprint
-
-pdf_bp = Blueprint('pdf', __name__, template_folder='templates/pdf')
-
-from . import routes 
+# Las rutas (pdf_bp) se importan y registran en create_app; importar este paquete no carga Flask,
+# así la línea de comandos, los benchmarks y los procesos del pool arrancan sin la app web
@@ -0,0 +1,168 @@
+import os
+
+import tempfile
+
+from concurrent.futures import as_completed
+
+from .cache import process_cached
+from .metrics import METRICS
+from .pools import process_pool
+from .uploads import inspect_pdf
+
+class _Worker:
+    """
+    Procesadores "calientes" de quien testa un lote, uno por clase y creados una
+    sola vez, con sus opciones y la caché. Cada proceso del pool tiene el suyo
+    (`_worker`); una corrida en línea crea uno propio, así dos lotes en el
+    mismo proceso (una petición y un trabajo de la cola) no se pisan.
+    """
+
+    def __init__(self, cache=None, options=None):
+        self.cache = cache
+        self.options = options or {}
+        self._processors = {}
+
+    def processor(self, processor_class):
+        processor = self._processors.get(processor_class)
+        if processor is None:
+            processor = self._processors[processor_class] = processor_class(**self.options)
+        return processor
+
+
+# El de este proceso, si es un proceso del pool
+_worker = None
+
+
+def _init_pool_worker(cache=None, options=None):
+    global _worker
+    # Lo que se haya medido al importar en el servidor de forkserver no es de este lote
+    METRICS.drain()
+    _worker = _Worker(cache, options)
+
+
+def _process_file(worker, pdf_path, processor_class, output_dir, page_progress=None):
+    # El resultado se guarda directo en disco; solo la ruta viaja de regreso al proceso padre
+    fd, output_path = tempfile.mkstemp(suffix='.pdf', dir=output_dir)
+    os.close(fd)
+    processor = worker.processor(processor_class)
+    try:
+        if page_progress is None:
+            process_cached(processor, pdf_path, output_path, worker.cache)
+        else:
+            with page_progress.track(processor, os.path.basename(pdf_path)):
+                process_cached(processor, pdf_path, output_path, worker.cache)
+    except Exception:
+        os.remove(output_path)
+        raise
+    return output_path
+
+
+def _preview_file(worker, pdf_path, processor_class):
+    return worker.processor(processor_class).Preview(pdf_path)
+
+
+def _inspect_file(worker, pdf_path, processor_class):
+    return inspect_pdf(pdf_path)
+
+
+def _run_remote(task, pdf_path, processor_class, *args):
+    # En un proceso del pool las métricas viajan de regreso con el resultado, también si falla
+    try:
+        return task(_worker, pdf_path, processor_class, *args), None, METRICS.drain()
+    except Exception as e:
+        return None, e, METRICS.drain()
+
+
+def resolve_workers(workers, file_count):
+    """ Número de procesos a usar: el configurado (o núcleos disponibles) sin pasar del número de archivos. """
+    if not workers:
+        workers = os.cpu_count() or 1
+    return max(1, min(int(workers), file_count))
+
+
+def process_batch(processor_class, pdf_paths, output_dir, workers=None, inline=True, cache=None, options=None):
+    """
+    Procesa varios PDF repartiéndolos en un pool de procesos.
+
+    Genera tuplas (pdf_path, output_path, error) conforme terminan los archivos.
+    Cada salida queda en un archivo dentro de `output_dir` que el llamador debe
+    borrar; `output_path` es None cuando `error` no lo es. Con `inline=False`
+    el trabajo nunca corre en el proceso que llama, aunque baste un solo proceso.
+    Si se pasa una ResultCache los archivos sin cambios se sirven desde ella.
+    `options` son las opciones con que se crean los procesadores (p. ej. delete_qr).
+    """
+    return process_routed([(pdf_path, processor_class) for pdf_path in pdf_paths], output_dir, workers, inline, cache,
+                          options)
+
+
+def process_routed(routes, output_dir, workers=None, inline=True, cache=None, options=None, page_progress=None):
+    """
+    Como process_batch, pero cada archivo con su propio procesador: `routes`
+    son tuplas (pdf_path, processor_class). Así un lote mixto corre en un
+    solo pool. Con `page_progress` (un progress.PageProgress) los procesos
+    van publicando las páginas que terminan.
+    """
+    return _run_routed(_process_file, (output_dir, page_progress), routes, workers, inline, cache, options)
+
+
+def preview_routed(routes, workers=None, options=None):
+    """
+    Vista previa (RedactionPipeline.Preview) de cada archivo en el pool;
+    genera tuplas (pdf_path, preview, error) conforme terminan.
+    """
+    return _run_routed(_preview_file, (), routes, workers, True, None, options)
+
+
+def inspect_batch(pdf_paths, workers=None, inline=True):
+    """
+    Páginas y tipo detectado (uploads.inspect_pdf) de cada archivo en el pool;
+    genera tuplas (pdf_path, (páginas, Classification), error) conforme terminan.
+    """
+    return _run_routed(_inspect_file, (), [(pdf_path, None) for pdf_path in pdf_paths], workers, inline, None, None)
+
+
+def _run_routed(task, args, routes, workers, inline, cache, options):
+    """ Corre task(worker, pdf_path, processor_class, *args) por archivo y genera (pdf_path, resultado, error). """
+    if not routes:
+        return
+
+    # Los archivos más grandes primero para que ningún proceso se quede con la cola larga al final
+    routes = sorted(routes, key=lambda route: _file_size(route[0]), reverse=True)
+    workers = resolve_workers(workers, len(routes))
+
+    if workers == 1 and inline:
+        worker = _Worker(cache, options)
+        for pdf_path, processor_class in routes:
+            try:
+                yield pdf_path, task(worker, pdf_path, processor_class, *args), None
+            except Exception as e:
+                yield pdf_path, None, e
+        return
+
+    executor = process_pool(workers, _init_pool_worker, (cache, options))
+    try:
+        futures = {
+            executor.submit(_run_remote, task, pdf_path, processor_class, *args): pdf_path
+            for pdf_path, processor_class in routes
+        }
+
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                result, error, metrics = future.result()
+            except Exception as e:
+                yield pdf_path, None, e
+                continue
+
+            METRICS.merge(metrics)
+            yield pdf_path, result, error
+    finally:
+        # Si el cliente abandona la descarga no tiene caso terminar los archivos pendientes
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,259 @@
+import hashlib
+
+import os
+
+import time
+
+import zipfile
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, File, Data, Epilogue, NeedData
+
+from .uploads import CHUNK_SIZE, UploadError, clean_filename, copy_stream
+
+ZIP_MIMETYPES = {'application/zip', 'application/x-zip-compressed'}
+
+# Límites de cada ZIP, aparte del tamaño máximo por archivo (que puede no estar configurado): un ZIP
+# que los pase se rechaza completo antes de extraer nada
+ZIP_MAX_ENTRIES = 5000
+ZIP_MAX_BYTES = 4 * 1024 ** 3
+
+
+class BulkUpload:
+    """
+    Carga de muchos PDF en una sola petición: multipart con varios archivos o un ZIP.
+
+    El multipart se decodifica conforme llega y cada archivo se escribe
+    directo a disco con su hash; los ZIP se guardan a disco y sus entradas se
+    extraen por bloques en un pool de hilos mientras se siguen leyendo las
+    demás. Cada ZIP tiene un límite de entradas y de bytes descomprimidos, y
+    un nombre que ya vino en la misma carga (p. ej. a/x.pdf y b/x.pdf) se
+    rechaza en lugar de sobreescribir al primero. Validar (abrir con PyMuPDF, que no admite varios hilos) y publicar
+    cada archivo se hace al final, uno por uno en el hilo de la petición.
+    `summary()` da los archivos aceptados y los rechazados con su motivo.
+    """
+
+    def __init__(self, uploads, workers=8, zip_max_entries=ZIP_MAX_ENTRIES, zip_max_bytes=ZIP_MAX_BYTES):
+        self.uploads = uploads
+        self.workers = workers
+        self.zip_max_entries = zip_max_entries
+        self.zip_max_bytes = zip_max_bytes
+        self._futures = []
+        self._rejected = []
+        self._sources = {}
+        self._start = time.perf_counter()
+
+    def ingest(self, content_type, stream):
+        mimetype, options = parse_options_header(content_type)
+        if mimetype != 'multipart/form-data' and mimetype not in ZIP_MIMETYPES:
+            raise UploadError('Se espera multipart/form-data o un ZIP', 415)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            if mimetype in ZIP_MIMETYPES:
+                self._ingest_zip_stream(stream)
+            else:
+                boundary = options.get('boundary')
+                if not boundary:
+                    raise UploadError('Falta el boundary del multipart')
+                self._ingest_multipart(stream, boundary.encode('latin-1'))
+        finally:
+            # También si la petición se corta: los archivos que ya llegaron completos se publican
+            self._executor.shutdown(wait=True)
+            uploaded = self._publish()
+
+        return self.summary(uploaded)
+
+    def _publish(self):
+        uploaded = []
+        for future in self._futures:
+            try:
+                uploaded.append(self.uploads.publish(*future.result()))
+            except Exception as e:
+                self._reject(future.filename, str(e))
+        return uploaded
+
+    def summary(self, uploaded):
+        return {
+            'uploaded': uploaded,
+            'rejected': self._rejected,
+            'count': len(uploaded),
+            'pages': sum(item['pages'] for item in uploaded),
+            'bytes': sum(item['size'] for item in uploaded),
+            'seconds': round(time.perf_counter() - self._start, 3),
+        }
+
+    def _submit(self, filename, fn, *args):
+        """ Escribe un archivo a disco en el pool; el futuro da los argumentos de `publish`. """
+        future = self._executor.submit(fn, *args)
+        future.filename = filename
+        self._futures.append(future)
+
+    def _written(self, filename, part_path, digest, size):
+        """ Archivo que ya quedó completo en disco; se publica al final junto con los del pool. """
+        future = Future()
+        future.set_result((part_path, filename, digest, size))
+        future.filename = filename
+        self._futures.append(future)
+
+    def _reject(self, filename, error):
+        self._rejected.append({'filename': filename, 'error': error})
+
+    def _claim_name(self, filename, source):
+        """ Aparta el nombre destino para `source`; False (y lo rechaza) si ya lo trae otro archivo de la carga. """
+        first = self._sources.setdefault(filename, source)
+        if first != source:
+            self._reject(source, f'Ya viene otro archivo con el nombre {filename} en esta carga ({first})')
+            return False
+        return True
+
+    def _ingest_multipart(self, stream, boundary):
+        decoder = MultipartDecoder(boundary)
+        part = None
+
+        try:
+            while True:
+                data = stream.read(CHUNK_SIZE)
+                decoder.receive_data(data or None)
+
+                event = decoder.next_event()
+                while not isinstance(event, (Epilogue, NeedData)):
+                    if isinstance(event, File):
+                        part = self._start_part(event.filename)
+                    elif isinstance(event, Data):
+                        if part is not None:
+                            part.write(event.data)
+                            if not event.more_data:
+                                self._finish_part(part)
+                                part = None
+                    else:
+                        # Campos de texto: no se usan
+                        part = None
+                    event = decoder.next_event()
+
+                if isinstance(event, Epilogue) or not data:
+                    break
+        except Exception:
+            if part is not None:
+                part.discard()
+            raise
+
+        if part is not None:
+            part.discard()
+            self._reject(part.filename, 'La petición terminó antes que el archivo')
+
+    def _start_part(self, filename):
+        if filename and filename.lower().endswith('.zip'):
+            return _Part(self.uploads, filename, archive=True)
+        try:
+            clean = clean_filename(filename)
+        except UploadError as e:
+            self._reject(filename, str(e))
+            return None
+        if not self._claim_name(clean, filename):
+            return None
+        return _Part(self.uploads, clean)
+
+    def _finish_part(self, part):
+        part.close()
+        if part.archive:
+            self._ingest_zip(part.path, part.filename)
+        else:
+            self._written(part.filename, part.path, part.digest, part.size)
+
+    def _ingest_zip_stream(self, stream):
+        part = _Part(self.uploads, 'archivo.zip', archive=True)
+        try:
+            copy_stream(stream, part)
+        except Exception:
+            part.discard()
+            raise
+        part.close()
+        self._ingest_zip(part.path, part.filename)
+
+    def _ingest_zip(self, path, name):
+        """ Extrae en paralelo las entradas PDF del ZIP (zipfile permite leer entradas desde varios hilos). """
+        try:
+            archive = zipfile.ZipFile(path)
+        except zipfile.BadZipFile:
+            os.remove(path)
+            self._reject(name, 'El ZIP no es válido')
+            return
+
+        entries = [info for info in archive.infolist()
+                   if not info.is_dir() and not info.filename.startswith('__MACOSX/')]
+        # zipfile nunca entrega más bytes que el tamaño declarado de cada entrada, así que basta con sumarlos
+        error = None
+        if self.zip_max_entries and len(entries) > self.zip_max_entries:
+            error = f'El ZIP tiene demasiados archivos ({len(entries)}, máximo {self.zip_max_entries})'
+        elif self.zip_max_bytes and sum(info.file_size for info in entries) > self.zip_max_bytes:
+            error = f'El ZIP descomprimido pasa de {self.zip_max_bytes} bytes'
+        if error is not None:
+            archive.close()
+            os.remove(path)
+            self._reject(name, error)
+            return
+
+        futures = []
+        for info in entries:
+            try:
+                filename = clean_filename(info.filename)
+            except UploadError as e:
+                self._reject(info.filename, str(e))
+                continue
+            if self.uploads.max_bytes and info.file_size > self.uploads.max_bytes:
+                self._reject(info.filename, 'El archivo es demasiado grande')
+                continue
+            if not self._claim_name(filename, f'{name}:{info.filename}'):
+                continue
+
+            self._submit(filename, self._extract, archive, info, filename)
+            futures.append(self._futures[-1])
+
+        # El ZIP se borra cuando terminan de leerse todas sus entradas
+        def cleanup():
+            for future in futures:
+                future.exception()
+            archive.close()
+            os.remove(path)
+
+        self._executor.submit(cleanup)
+
+    def _extract(self, archive, info, filename):
+        f, part_path = self.uploads.new_part()
+        digest = hashlib.sha256()
+        try:
+            with f, archive.open(info) as entry:
+                # No se confía en el tamaño declarado en el ZIP: se corta al pasar del límite
+                limit = self.uploads.max_bytes + 1 if self.uploads.max_bytes else None
+                size = copy_stream(entry, f, digest, limit)
+        except (zipfile.BadZipFile, OSError, EOFError) as e:
+            os.remove(part_path)
+            raise UploadError(f'No se pudo extraer del ZIP: {e}')
+
+        return part_path, filename, digest, size
+
+
+class _Part:
+    """ Archivo de una petición multipart que se va escribiendo a disco con su hash. """
+
+    def __init__(self, uploads, filename, archive=False):
+        self.filename = filename
+        self.archive = archive
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._file, self.path = uploads.new_part()
+
+    def write(self, data):
+        self._file.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.path)
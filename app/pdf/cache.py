@@ -0,0 +1,139 @@
+import hashlib
+
+import os
+
+import shutil
+
+import tempfile
+
+from .metrics import METRICS
+from .parallel import process_document
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Caché en disco de PDFs testados, direccionada por contenido.
+
+    La llave combina el SHA-256 del PDF original, la clase del procesador, la
+    versión de sus patrones y la de su salida (OUTPUT_VERSION), así que
+    cambiar las reglas o la forma de testar invalida las entradas viejas sin
+    borrar nada a mano. Cuando la carpeta pasa de `max_bytes` se eliminan
+    primero las entradas usadas hace más tiempo (LRU por mtime).
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, pdf_path, processor):
+        version = f"{getattr(processor, 'PATTERNS_VERSION', 0)}.{getattr(processor, 'OUTPUT_VERSION', 0)}"
+        # Solo las opciones activas: con las de omisión la llave es la misma de siempre
+        options = ''.join(f'-{name}' if value is True else f'-{name}={value}'
+                          for name, value in sorted(getattr(processor, 'options', {}).items()) if value)
+        return f'{file_sha256(pdf_path)}-{type(processor).__name__}-{version}{options}'
+
+    def _path(self, key):
+        return os.path.join(self.folder, f'{key}.pdf')
+
+    def get(self, key):
+        """ Ruta del resultado en caché o None; un acierto actualiza su mtime para el LRU. """
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            METRICS.inc('cache_misses_total')
+            return None
+
+        self.hits += 1
+        METRICS.inc('cache_hits_total')
+        return path
+
+    def put(self, key, source):
+        """ Guarda un resultado desde una ruta o un archivo abierto (BytesIO o SpooledOutput). """
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if isinstance(source, (str, os.PathLike)):
+                    with open(source, 'rb') as src:
+                        shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+                else:
+                    source.seek(0)
+                    shutil.copyfileobj(source, tmp, CHUNK_SIZE)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def process_cached(processor, pdf_path, output_path, cache=None, page_parallel=None):
+    """
+    Ejecuta `processor.ProcessPDF` pasando primero por la caché.
+
+    `output_path` puede ser una ruta o un archivo abierto, igual que en
+    ProcessPDF. Con `page_parallel` (un PageParallel) los documentos grandes
+    se testan por rangos de páginas en paralelo. Regresa True si el resultado
+    salió de la caché.
+    """
+    if cache is None:
+        process_document(processor, pdf_path, output_path, page_parallel)
+        return False
+
+    key = cache.key(pdf_path, processor)
+    cached_path = cache.get(key)
+
+    if cached_path is not None:
+        try:
+            if isinstance(output_path, (str, os.PathLike)):
+                shutil.copyfile(cached_path, output_path)
+            else:
+                with open(cached_path, 'rb') as src:
+                    shutil.copyfileobj(src, output_path, CHUNK_SIZE)
+            return True
+        except FileNotFoundError:
+            # Otro proceso la desalojó entre get() y la copia
+            pass
+
+    process_document(processor, pdf_path, output_path, page_parallel)
+    cache.put(key, output_path)
+    return False
@@ -0,0 +1,131 @@
+import re
+
+import unicodedata
+
+from collections import namedtuple
+
+import fitz
+
+# Tipo de documento (llave de PROCESSORS) o None, con la confianza y el puntaje de cada tipo
+Classification = namedtuple('Classification', ['kind', 'confidence', 'scores', 'low_confidence'])
+
+# Lo que se reporta de un archivo cuyo texto no se pudo leer
+UNKNOWN = Classification(None, 0.0, {}, True)
+
+# Páginas que se leen para clasificar; los datos que distinguen a cada tipo vienen al principio
+CLASSIFY_PAGES = 2
+
+# Con menos puntaje que esto, o si el segundo tipo queda cerca del primero, la clasificación es dudosa
+MIN_SCORE = 4
+MIN_MARGIN = 0.34
+
+# Una señal que se repite mucho no debe pesar más que varias señales distintas
+MAX_HITS = 3
+
+# (frase, peso) por tipo; se comparan sin acentos ni mayúsculas. Las frases de más peso son las mismas
+# que buscan los procesadores, el resto son del tema de cada resolución.
+SIGNALS = {
+    'residuos': [
+        ('persona fisica con actividad empresarial', 4),
+        ('ubicacion de la instalacion', 3),
+        ('residuos peligrosos', 3),
+        ('generador de residuos', 3),
+        ('rfc:', 2),
+        ('curp:', 2),
+        ('telefono:', 1),
+        ('correo electronico:', 1),
+        ('materiales y actividades riesgosas', 1),
+    ],
+    'impacto': [
+        ('registro federal de contribuyentes', 4),
+        ('instituto nacional electoral', 4),
+        ('en representacion', 3),
+        ('manifestacion de impacto ambiental', 3),
+        ('impacto y riesgo ambiental', 3),
+        ('acredita su personalidad', 2),
+        ('impacto ambiental', 1),
+    ],
+    'atmosfera': [
+        ('por medio de la cual la', 4),
+        ('personalidad juridica de la', 4),
+        ('licencia ambiental unica', 4),
+        ('licencia de funcionamiento', 3),
+        ('calidad del aire', 3),
+        ('fuentes fijas', 2),
+        ('emisiones', 1),
+        ('atmosfera', 1),
+    ],
+}
+
+_PATTERNS = {
+    kind: [(re.compile(re.escape(phrase)), weight) for phrase, weight in signals]
+    for kind, signals in SIGNALS.items()
+}
+
+
+def normalize(text):
+    """ Minúsculas y sin acentos, con los espacios colapsados. """
+    text = unicodedata.normalize('NFD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.split())
+
+
+def classify_text(text):
+    scores = {}
+    for kind, patterns in _PATTERNS.items():
+        scores[kind] = sum(min(len(pattern.findall(text)), MAX_HITS) * weight for pattern, weight in patterns)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    best, second = scores[ranked[0]], scores[ranked[1]]
+    confidence = (best - second) / best if best else 0.0
+    low_confidence = best < MIN_SCORE or confidence < MIN_MARGIN
+
+    return Classification(ranked[0] if best else None, round(confidence, 3), scores, low_confidence)
+
+
+def classify_document(doc, pages=CLASSIFY_PAGES):
+    """
+    Clasifica un documento abierto con el texto plano de sus primeras páginas;
+    solo se lee la siguiente página si con las anteriores no hay confianza.
+    """
+    text = ''
+    classification = classify_text(text)
+    for page_num in range(min(pages, len(doc))):
+        text += ' ' + normalize(doc[page_num].get_text("text"))
+        classification = classify_text(text)
+        if not classification.low_confidence:
+            break
+    return classification
+
+
+def classify_file(pdf_path, pages=CLASSIFY_PAGES):
+    with fitz.open(pdf_path) as doc:
+        return classify_document(doc, pages)
+
+
+def detect_kind(pdf):
+    """ Clasifica una ruta o un documento abierto; si el texto no se puede leer regresa UNKNOWN en lugar de fallar. """
+    try:
+        if isinstance(pdf, fitz.Document):
+            return classify_document(pdf)
+        return classify_file(pdf)
+    except Exception as e:
+        print(f"Error al clasificar el archivo {pdf}: {e}")
+        return UNKNOWN
+
+
+def route_files(pdf_paths, classify=detect_kind):
+    """
+    Reparte los PDF de un lote mixto por tipo. Regresa (rutas, dudosos):
+    `rutas` son tuplas (pdf_path, tipo) de los que se clasificaron con
+    confianza y `dudosos` tuplas (pdf_path, Classification) de los que hay
+    que revisar a mano, incluidos los que no se pudieron leer.
+    """
+    routes, flagged = [], []
+    for pdf_path in pdf_paths:
+        classification = classify(pdf_path)
+        if classification.low_confidence or classification.kind is None:
+            flagged.append((pdf_path, classification))
+        else:
+            routes.append((pdf_path, classification.kind))
+    return routes, flagged
@@ -0,0 +1,170 @@
+"""
+Testado por lotes desde la línea de comandos, sin Flask ni HTTP.
+
+    python -m app.pdf.cli entrada/ salida/ --kind residuos
+    python -m app.pdf.cli entrada/ salida/ --kind auto --workers 8
+
+Recorre `entrada` (con subcarpetas) y escribe cada PDF testado en la misma
+ruta relativa dentro de `salida`, con el nombre de descarga de su tipo. Los
+archivos cuya salida ya existe y es más nueva que el original se saltan
+(--force los vuelve a procesar). Con --kind auto cada archivo va al
+procesador de su tipo detectado y los de tipo dudoso se reportan sin testar.
+Al final imprime archivos y páginas por segundo, el perfil de guardado con los
+bytes escritos y los errores por archivo; el código de salida es 1 si alguno
+falló.
+"""
+
+import argparse
+
+import os
+
+import shutil
+
+import sys
+
+import tempfile
+
+import time
+
+from .batch import process_routed
+from .classify import route_files
+from .metrics import METRICS
+from .pipeline import DEFAULT_SAVE_PROFILE, SAVE_PROFILES
+from .processors import AUTO, PROCESSORS, get_processor_class, output_name
+
+
+def find_pdfs(input_dir, output_dir):
+    """ Rutas relativas de los PDF bajo `input_dir`, sin entrar a `output_dir` si está adentro. """
+    output_dir = os.path.abspath(output_dir)
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_dir)
+        for name in sorted(files):
+            if name.lower().endswith('.pdf') and not name.startswith('.'):
+                found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def output_path(output_dir, rel_path, kind):
+    return os.path.join(output_dir, os.path.dirname(rel_path), output_name(kind, os.path.basename(rel_path)))
+
+
+def is_up_to_date(pdf_path, target):
+    try:
+        return os.path.getmtime(target) >= os.path.getmtime(pdf_path)
+    except FileNotFoundError:
+        return False
+
+
+def run(input_dir, output_dir, kind, workers=None, force=False, verbose=False, options=None, out=sys.stdout):
+    """ Procesa el árbol y regresa el resumen (contadores, errores y dudosos). """
+    started = time.perf_counter()
+    rel_paths = find_pdfs(input_dir, output_dir)
+    # En modo auto todavía no se conoce el tipo: basta con que alguna de las salidas posibles esté al día
+    kinds = list(PROCESSORS) if kind == AUTO else [kind]
+
+    pending, skipped = [], 0
+    for rel_path in rel_paths:
+        pdf_path = os.path.join(input_dir, rel_path)
+        if not force and any(is_up_to_date(pdf_path, output_path(output_dir, rel_path, k)) for k in kinds):
+            skipped += 1
+        else:
+            pending.append(pdf_path)
+
+    flagged = []
+    if kind == AUTO:
+        routes, flagged = route_files(pending)
+    else:
+        routes = [(pdf_path, kind) for pdf_path in pending]
+    kinds = dict(routes)
+
+    summary = {'found': len(rel_paths), 'skipped': skipped, 'processed': 0, 'pages': 0, 'bytes': 0, 'bytes_out': 0,
+               'save_profile': (options or {}).get('save_profile') or DEFAULT_SAVE_PROFILE,
+               'errors': [], 'flagged': [(os.path.relpath(pdf_path, input_dir), classification)
+                                         for pdf_path, classification in flagged]}
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Las salidas se escriben junto al destino y se mueven al terminar, así una corrida interrumpida no deja
+    # archivos a medias que la siguiente tome por buenos
+    work_dir = tempfile.mkdtemp(prefix='.testado_', dir=output_dir)
+    pages_before = _pages_total()
+    try:
+        batch = process_routed([(pdf_path, get_processor_class(kinds[pdf_path])) for pdf_path in kinds],
+                               work_dir, workers, options=options)
+        for done, (pdf_path, result_path, error) in enumerate(batch, 1):
+            rel_path = os.path.relpath(pdf_path, input_dir)
+            if error is not None:
+                summary['errors'].append((rel_path, error))
+                print(f"[{done}/{len(kinds)}] Error en {rel_path}: {error}", file=out)
+                continue
+
+            target = output_path(output_dir, rel_path, kinds[pdf_path])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(result_path, target)
+            summary['processed'] += 1
+            summary['bytes'] += os.path.getsize(pdf_path)
+            summary['bytes_out'] += os.path.getsize(target)
+            if verbose:
+                print(f"[{done}/{len(kinds)}] {rel_path} -> {os.path.relpath(target, output_dir)}", file=out)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary['pages'] = _pages_total() - pages_before
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def _pages_total():
+    # Las páginas las cuenta cada proceso del pool al testar y llegan con sus métricas
+    counters, _ = METRICS.snapshot()
+    return sum(value for (name, _), value in counters.items() if name == 'pages_total')
+
+
+def print_summary(summary, out=sys.stdout):
+    seconds = summary['seconds'] or 1e-9
+    print(f"{summary['found']} PDF encontrados, {summary['skipped']} al día, {summary['processed']} testados, "
+          f"{len(summary['errors'])} con error, {len(summary['flagged'])} de tipo dudoso", file=out)
+    print(f"{seconds:.1f} s: {summary['processed'] / seconds:.2f} archivos/s, {summary['pages'] / seconds:.1f} páginas/s, "
+          f"{summary['bytes'] / seconds / 1024 ** 2:.1f} MB/s", file=out)
+    print(f"Perfil {summary['save_profile']}: {summary['bytes'] / 1024 ** 2:.1f} MB leídos, "
+          f"{summary['bytes_out'] / 1024 ** 2:.1f} MB escritos", file=out)
+
+    if summary['errors']:
+        print('\nErrores:', file=out)
+        for rel_path, error in summary['errors']:
+            print(f"  {rel_path}: {error}", file=out)
+
+    if summary['flagged']:
+        print('\nTipo dudoso (no se testaron):', file=out)
+        for rel_path, classification in summary['flagged']:
+            guess = classification.kind or 'desconocido'
+            print(f"  {rel_path}: ¿{guess}? (confianza {classification.confidence:.2f})", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Testa todos los PDF de una carpeta (y sus subcarpetas).')
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--kind', required=True, choices=[*PROCESSORS, AUTO],
+                        help="tipo de documento, o 'auto' para detectarlo en cada archivo")
+    parser.add_argument('--workers', type=int, help='procesos del pool (por omisión, todos los núcleos)')
+    parser.add_argument('--force', action='store_true', help='vuelve a procesar aunque la salida esté al día')
+    parser.add_argument('--delete-qr', action='store_true', help='quita los QR de la última página')
+    parser.add_argument('--qr-detector', choices=['pyzbar', 'qreader'],
+                        help='con --delete-qr, busca los QR en todas las páginas decodificando las imágenes candidatas')
+    parser.add_argument('--save-profile', choices=list(SAVE_PROFILES), default='compact',
+                        help="cómo se guardan los PDF: 'fast' sin limpieza, 'compact' (por omisión) o 'web' linealizado")
+    parser.add_argument('-v', '--verbose', action='store_true', help='imprime cada archivo testado')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f'No existe la carpeta {args.input_dir}')
+
+    summary = run(args.input_dir, args.output_dir, args.kind, args.workers, args.force, args.verbose,
+                  {'delete_qr': args.delete_qr, 'qr_detector': args.qr_detector, 'save_profile': args.save_profile})
+    print_summary(summary)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
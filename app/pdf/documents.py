@@ -0,0 +1,265 @@
+import os
+
+import sqlite3
+
+import threading
+
+import time
+
+from contextlib import contextmanager
+
+from .batch import inspect_batch
+from .cache import file_sha256
+from .classify import Classification, detect_kind, UNKNOWN
+from .uploads import inspect_pdf, UploadError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    pages INTEGER,
+    kind TEXT,
+    kind_confidence REAL,
+    kind_low_confidence INTEGER,
+    uploaded_at REAL NOT NULL,
+    last_processor TEXT,
+    last_status TEXT,
+    last_error TEXT,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS documents_uploaded_at ON documents (uploaded_at);
+CREATE INDEX IF NOT EXISTS documents_size ON documents (size);
+CREATE INDEX IF NOT EXISTS documents_pages ON documents (pages);
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    folder_mtime INTEGER,
+    checked_at REAL
+);
+INSERT OR IGNORE INTO sync_state (id) VALUES (1);
+"""
+
+# Columnas por las que se puede ordenar un listado
+SORT_COLUMNS = ('filename', 'size', 'pages', 'kind', 'uploaded_at', 'processed_at')
+
+OK, ERROR = 'ok', 'error'
+
+
+class DocumentIndex:
+    """
+    Índice en SQLite de los PDF de la carpeta de cargas.
+
+    Guarda tamaño, SHA-256, páginas, tipo detectado (con su confianza), fecha de carga y el
+    resultado del último testado de cada archivo, para que los listados
+    (paginados y ordenados) y los lotes no tengan que recorrer la carpeta.
+    Se actualiza al subir y borrar, y esos cambios guardan el mtime en que
+    dejan la carpeta. `sync` lo reconcilia con lo que haya en disco (archivos
+    copiados a mano o borrados por fuera); corre al arrancar y después en
+    segundo plano (`watch`), nunca dentro de una petición. La base no puede
+    vivir en la carpeta de cargas: su WAL se crea y se borra con cada conexión
+    y cambiaría el mtime de la carpeta todo el tiempo.
+    """
+
+    def __init__(self, db_path, upload_folder):
+        self.db_path = db_path
+        self.upload_folder = upload_folder
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, filename, size, sha256=None, pages=None, kind=None, kind_confidence=None, kind_low_confidence=None,
+            uploaded_at=None):
+        """ Registra (o reemplaza) un archivo recién subido; el resultado anterior ya no aplica. """
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO documents '
+                '(filename, size, sha256, pages, kind, kind_confidence, kind_low_confidence, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (filename, size, sha256, pages, kind, kind_confidence, kind_low_confidence, uploaded_at or time.time()),
+            )
+            self._mark_synced(conn)
+
+    def remove(self, filename):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM documents WHERE filename = ?', (filename,))
+            self._mark_synced(conn)
+
+    def _mark_synced(self, conn, mtime=None):
+        # El cambio que acaba de hacer la app ya está en el índice: no hace falta que otro proceso lo reconcilie
+        if mtime is None:
+            mtime = os.stat(self.upload_folder).st_mtime_ns
+        conn.execute('UPDATE sync_state SET folder_mtime = ? WHERE id = 1', (mtime,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM documents')
+
+    def get(self, filename):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM documents WHERE filename = ?', (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def list(self, offset=0, limit=50, sort='filename', descending=False):
+        """ Una página del listado; `sort` debe ser una de SORT_COLUMNS. """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f'No se puede ordenar por {sort}')
+        order = 'DESC' if descending else 'ASC'
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT * FROM documents ORDER BY {sort} {order}, filename LIMIT ? OFFSET ?', (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def filenames(self):
+        """ Todos los nombres en orden alfabético; para lotes que antes recorrían la carpeta. """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute('SELECT filename FROM documents ORDER BY filename')]
+
+    def record_result(self, filename, processor, error=None):
+        """ Guarda el resultado del último testado de un archivo. """
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE documents SET last_processor = ?, last_status = ?, last_error = ?, processed_at = ? '
+                'WHERE filename = ?',
+                (processor, ERROR if error else OK, str(error) if error else None, time.time(), filename),
+            )
+
+    def set_kind(self, filename, classification, pages=None):
+        """ Guarda el tipo detectado y, si se pasan, las páginas. """
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE documents SET kind = ?, kind_confidence = ?, kind_low_confidence = ?, '
+                'pages = COALESCE(?, pages) WHERE filename = ?',
+                (classification.kind, classification.confidence, int(classification.low_confidence), pages, filename),
+            )
+
+    def inspection(self, filename):
+        """ (páginas, Classification) que el índice ya tiene de un archivo, sin abrirlo; None si le falta alguno. """
+        document = self.get(filename)
+        if not document or document['pages'] is None or document['kind_confidence'] is None:
+            return None
+        return document['pages'], _classification(document)
+
+    def classify(self, pdf_path):
+        """ Tipo detectado de un archivo subido; si el índice aún no lo tiene lo calcula y lo guarda. """
+        filename = os.path.basename(pdf_path)
+        document = self.get(filename)
+        if document and document['kind_confidence'] is not None:
+            return _classification(document)
+
+        classification = detect_kind(pdf_path)
+        self.set_kind(filename, classification)
+        return classification
+
+    def sync(self, pool=False):
+        """
+        Agrega los PDF de la carpeta que no estén en el índice (calculando hash,
+        páginas y tipo) y quita los que ya no existen. Regresa (agregados, quitados).
+
+        Con `pool` las páginas y el tipo se sacan en el pool de procesos (desde
+        un hilo en segundo plano PyMuPDF no debe correr en el proceso); sin él,
+        en este mismo proceso (el maestro al arrancar, la línea de comandos).
+        """
+        # El mtime se toma antes de recorrer: un cambio durante el recorrido provoca otro
+        mtime = os.stat(self.upload_folder).st_mtime_ns
+        on_disk = {}
+        for entry in os.scandir(self.upload_folder):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                on_disk[entry.name] = entry.stat()
+
+        indexed = set(self.filenames())
+        missing = [name for name in on_disk if name not in indexed]
+        gone = [name for name in indexed if name not in on_disk]
+
+        rows = []
+        for name, (pages, (kind, confidence, _, low_confidence)) in self._inspect(missing, pool):
+            path = os.path.join(self.upload_folder, name)
+            rows.append((name, on_disk[name].st_size, file_sha256(path), pages, kind, confidence,
+                         int(low_confidence), on_disk[name].st_mtime))
+
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO documents '
+                '(filename, size, sha256, pages, kind, kind_confidence, kind_low_confidence, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+            conn.executemany('DELETE FROM documents WHERE filename = ?', [(name,) for name in gone])
+            self._mark_synced(conn, mtime)
+
+        return len(missing), len(gone)
+
+    def _inspect(self, names, pool):
+        """ Tuplas (nombre, (páginas, Classification)); uno que no se puede abrir queda sin páginas y sin tipo. """
+        paths = [os.path.join(self.upload_folder, name) for name in names]
+        if pool:
+            for pdf_path, inspection, error in inspect_batch(paths, inline=False):
+                yield os.path.basename(pdf_path), inspection if error is None else (None, UNKNOWN)
+            return
+
+        for pdf_path in paths:
+            try:
+                inspection = inspect_pdf(pdf_path)
+            except UploadError:
+                inspection = (None, UNKNOWN)
+            yield os.path.basename(pdf_path), inspection
+
+    def refresh(self, interval=0):
+        """
+        Corre `sync` (con el pool) si la carpeta cambió desde la última
+        reconciliación o el último cambio hecho por la app, en cualquier
+        proceso. Entre todos los procesos solo uno revisa cada `interval`
+        segundos; los demás regresan (0, 0) sin tocar la carpeta.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            folder_mtime, checked_at = conn.execute(
+                'SELECT folder_mtime, checked_at FROM sync_state WHERE id = 1'
+            ).fetchone()
+            if checked_at is not None and now - checked_at < interval:
+                conn.execute('COMMIT')
+                return 0, 0
+            conn.execute('UPDATE sync_state SET checked_at = ? WHERE id = 1', (now,))
+            conn.execute('COMMIT')
+
+        if os.stat(self.upload_folder).st_mtime_ns == folder_mtime:
+            return 0, 0
+        return self.sync(pool=True)
+
+    def watch(self, interval=60):
+        """ Hilo que llama a `refresh` cada `interval` segundos. """
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    # Con medio intervalo de margen para que el propio proceso no se salte su turno por un redondeo
+                    added, removed = self.refresh(interval / 2)
+                except Exception as e:
+                    print(f"Error al sincronizar el índice de archivos: {e}")
+                    continue
+                if added or removed:
+                    print(f"Índice de archivos: {added} agregados, {removed} quitados")
+
+        threading.Thread(target=loop, name='testado-index', daemon=True).start()
+
+
+def _classification(document):
+    return Classification(document['kind'], document['kind_confidence'], None, bool(document['kind_low_confidence']))
@@ -0,0 +1,351 @@
+import json
+
+import os
+
+import shutil
+
+import sqlite3
+
+import tempfile
+
+import threading
+
+import time
+
+import uuid
+
+from contextlib import contextmanager
+
+from .batch import inspect_batch, process_routed
+from .classify import UNKNOWN, route_files
+from .processors import AUTO, get_processor_class, output_name
+from .progress import PageProgress
+from .zipstream import stream_zip
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    files TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner_pid INTEGER,
+    files_done INTEGER NOT NULL DEFAULT 0,
+    files_total INTEGER NOT NULL,
+    pages_total INTEGER,
+    errors TEXT NOT NULL DEFAULT '[]',
+    save_profile TEXT,
+    bytes_out INTEGER,
+    result_path TEXT,
+    result_name TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_pages (
+    job_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    pages_done INTEGER NOT NULL,
+    PRIMARY KEY (job_id, filename)
+);
+"""
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'error'
+
+
+class JobQueue:
+    """
+    Cola local de trabajos de testado respaldada por SQLite.
+
+    Cualquier proceso de gunicorn puede consultar el estado de un trabajo porque
+    todo vive en la base. Cada proceso tiene `workers` hilos que toman trabajos
+    de la cola en cuanto llegan (submit los despierta) o cada `poll_interval`
+    segundos, así que un trabajo corre aunque el proceso que lo recibió ya no
+    exista. Los hilos no abren PDFs: contar páginas, clasificar y testar va a
+    un pool de procesos aparte (PyMuPDF no admite varios hilos).
+
+    Cada trabajo en curso guarda el pid de su proceso; los que quedan `running`
+    con un proceso que ya murió se regresan a la cola al crear la cola y cada
+    vez que un hilo se queda sin trabajo.
+    """
+
+    def __init__(self, jobs_folder, upload_folder, workers=1, batch_workers=None, retention=24 * 3600, cache=None,
+                 index=None, options=None, poll_interval=5):
+        self.jobs_folder = jobs_folder
+        self.upload_folder = upload_folder
+        self.batch_workers = batch_workers
+        self.cache = cache
+        self.index = index
+        self.options = options
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.db_path = os.path.join(jobs_folder, 'jobs.sqlite3')
+        self.pid = os.getpid()
+
+        os.makedirs(jobs_folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+        self.reclaim()
+
+        self._wakeup = threading.Event()
+        for number in range(workers):
+            threading.Thread(target=self._poll, name=f'testado-job-{number}', daemon=True).start()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def submit(self, kind, filenames, save_profile=None):
+        """
+        Registra un trabajo y regresa su id de inmediato; el procesamiento corre
+        en segundo plano. `save_profile` reemplaza el de las opciones de la cola.
+        """
+        if kind != AUTO:
+            get_processor_class(kind)  # KeyError si el tipo no existe
+
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, files, status, files_total, save_profile, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(filenames), QUEUED, len(filenames), save_profile, time.time()),
+            )
+
+        self.purge()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                'SELECT *, (SELECT COALESCE(SUM(pages_done), 0) FROM job_pages WHERE job_id = jobs.id) AS pages_done '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['files'] = json.loads(job['files'])
+        job['errors'] = json.loads(job['errors'])
+        return job
+
+    def purge(self):
+        """ Borra los trabajos terminados más viejos que `retention` junto con su resultado. """
+        limit = time.time() - self.retention
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, result_path FROM jobs WHERE status IN (?, ?) AND finished_at < ?', (DONE, FAILED, limit)
+            ).fetchall()
+            for job_id, result_path in rows:
+                if result_path and os.path.exists(result_path):
+                    os.remove(result_path)
+                conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+                conn.execute('DELETE FROM job_pages WHERE job_id = ?', (job_id,))
+
+    def reclaim(self):
+        """ Regresa a la cola los trabajos `running` cuyo proceso ya no existe; regresa cuántos. """
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT id, owner_pid FROM jobs WHERE status = ?', (RUNNING,)).fetchall()
+            orphans = [job_id for job_id, owner_pid in rows if not _alive(owner_pid)]
+            conn.executemany(
+                "UPDATE jobs SET status = ?, owner_pid = NULL, started_at = NULL, files_done = 0, errors = '[]', "
+                "bytes_out = NULL WHERE id = ?",
+                [(QUEUED, job_id) for job_id in orphans],
+            )
+            conn.executemany('DELETE FROM job_pages WHERE job_id = ?', [(job_id,) for job_id in orphans])
+            conn.execute('COMMIT')
+
+        # Las salidas a medias del proceso que murió
+        for entry in os.scandir(self.jobs_folder):
+            if entry.is_dir() and any(entry.name.startswith(f'job_{job_id}_') for job_id in orphans):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+        for job_id in orphans:
+            print(f"Trabajo {job_id} regresado a la cola: su proceso ya no existe")
+        return len(orphans)
+
+    def _poll(self):
+        while True:
+            try:
+                idle = not self._run_next() and not self.reclaim()
+            except Exception as e:
+                print(f"Error en la cola de trabajos: {e}")
+                idle = True
+            if idle:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self):
+        """ Toma el trabajo en cola más antiguo de forma atómica entre procesos. """
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+
+            conn.execute('UPDATE jobs SET status = ?, owner_pid = ?, started_at = ? WHERE id = ?',
+                         (RUNNING, os.getpid(), time.time(), row[0]))
+            conn.execute('COMMIT')
+            return row[0]
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def _file_pages(self, job_id, filename, pages):
+        # Un archivo terminado (o descartado) cuenta con todas sus páginas, las haya reportado el pool o no
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO job_pages (job_id, filename, pages_done) VALUES (?, ?, ?)',
+                         (job_id, filename, pages))
+
+    def _run_next(self):
+        """ Corre el siguiente trabajo en cola; regresa False si no había ninguno. """
+        job_id = self._claim()
+        if job_id is None:
+            return False
+
+        job = self.get(job_id)
+        try:
+            self._run(job)
+        except Exception as e:
+            print(f"Error en el trabajo {job_id}: {e}")
+            job['errors'].append({'file': None, 'error': str(e)})
+            self._update(job_id, status=FAILED, errors=json.dumps(job['errors']), finished_at=time.time())
+        return True
+
+    def _run(self, job):
+        job_id, kind, filenames = job['id'], job['kind'], job['files']
+        pdf_paths = [os.path.join(self.upload_folder, filename) for filename in filenames]
+        inspections = self._inspect(pdf_paths)
+        pages = {pdf_path: inspections[pdf_path][0] for pdf_path in pdf_paths}
+        self._update(job_id, pages_total=sum(pages.values()))
+
+        output_dir = tempfile.mkdtemp(prefix=f'job_{job_id}_', dir=self.jobs_folder)
+        outputs = []
+        errors = []
+        bytes_out = 0
+        options = dict(self.options or {})
+        if job['save_profile']:
+            options['save_profile'] = job['save_profile']
+
+        if kind == AUTO:
+            # Los de tipo dudoso no se testan con un procesador que podría no ser el suyo; se reportan
+            routes, flagged = route_files(pdf_paths, lambda pdf_path: inspections[pdf_path][1])
+            for pdf_path, classification in flagged:
+                errors.append({'file': os.path.basename(pdf_path), 'error': 'No se pudo determinar el tipo de documento',
+                               'kind': classification.kind, 'confidence': classification.confidence})
+                self._file_pages(job_id, os.path.basename(pdf_path), pages[pdf_path])
+            self._update(job_id, files_done=len(errors), errors=json.dumps(errors))
+        else:
+            routes = [(pdf_path, kind) for pdf_path in pdf_paths]
+        kinds = dict(routes)
+
+        try:
+            batch = process_routed([(pdf_path, get_processor_class(kinds[pdf_path])) for pdf_path in kinds],
+                                   output_dir, self.batch_workers, inline=False, cache=self.cache,
+                                   options=options, page_progress=PageProgress(JobPages(self.db_path), job_id))
+            for pdf_path, output_path, error in batch:
+                filename = os.path.basename(pdf_path)
+                if self.index is not None:
+                    self.index.record_result(filename, get_processor_class(kinds[pdf_path]).__name__, error)
+                if error is not None:
+                    print(f"Error al procesar el archivo {filename}: {error}")
+                    errors.append({'file': filename, 'error': str(error)})
+                else:
+                    outputs.append((output_name(kinds[pdf_path], filename), output_path))
+                    bytes_out += os.path.getsize(output_path)
+
+                self._file_pages(job_id, filename, pages[pdf_path])
+                self._update(job_id, files_done=len(outputs) + len(errors), errors=json.dumps(errors),
+                             bytes_out=bytes_out)
+
+            if not outputs:
+                self._update(job_id, status=FAILED, finished_at=time.time())
+                return
+
+            if len(filenames) == 1:
+                result_name, output_path = outputs[0]
+                result_path = os.path.join(self.jobs_folder, f'{job_id}.pdf')
+                os.replace(output_path, result_path)
+            else:
+                result_name = 'procesados.zip'
+                result_path = os.path.join(self.jobs_folder, f'{job_id}.zip')
+                with open(result_path, 'wb') as result_file:
+                    for chunk in stream_zip(outputs):
+                        result_file.write(chunk)
+
+            self._update(job_id, status=DONE, result_path=result_path, result_name=result_name,
+                         finished_at=time.time())
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    def _inspect(self, pdf_paths):
+        """
+        (páginas, Classification) de cada archivo: del índice si ya los tiene y,
+        si no, de inspect_pdf en el pool de procesos. Uno que no se puede abrir
+        cuenta con 0 páginas y tipo desconocido.
+        """
+        inspections = {}
+        if self.index is not None:
+            for pdf_path in pdf_paths:
+                inspection = self.index.inspection(os.path.basename(pdf_path))
+                if inspection is not None:
+                    inspections[pdf_path] = inspection
+
+        missing = [pdf_path for pdf_path in pdf_paths if pdf_path not in inspections]
+        for pdf_path, inspection, error in inspect_batch(missing, self.batch_workers, inline=False):
+            if error is not None:
+                inspection = (0, UNKNOWN)
+            elif self.index is not None:
+                pages, classification = inspection
+                self.index.set_kind(os.path.basename(pdf_path), classification, pages)
+            inspections[pdf_path] = inspection
+        return inspections
+
+
+class JobPages:
+    """
+    Lo que necesita progress.PageProgress para sumar a un trabajo las páginas
+    que testan los procesos del pool; solo lleva la ruta de la base, así que
+    viaja al pool sin la cola ni sus hilos.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def pages_done(self, job_id, filename, pages):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO job_pages (job_id, filename, pages_done) VALUES (?, ?, ?) '
+                    'ON CONFLICT (job_id, filename) DO UPDATE SET pages_done = pages_done + excluded.pages_done',
+                    (job_id, filename, pages),
+                )
+        finally:
+            conn.close()
+
+
+def _alive(pid):
+    """ Si el proceso existe (en esta máquina); la cola es local, así que basta con el pid. """
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,121 @@
+import os
+
+import threading
+
+import time
+
+from contextlib import contextmanager
+
+PREFIX = 'testado_'
+
+# Límites (segundos) de los histogramas de duración
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Metrics:
+    """
+    Contadores e histogramas en memoria de un proceso.
+
+    Los procesos del pool mandan sus valores de regreso con cada archivo
+    (drain/merge), así que cada proceso de gunicorn reporta también el trabajo
+    hecho por sus hijos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage):
+        """ Mide la duración de una etapa del testado (extracción, redacción, guardado...). """
+        return self.timer('stage_seconds', stage=stage)
+
+    def snapshot(self):
+        with self._lock:
+            return (dict(self._counters),
+                    {key: [list(buckets), total, count] for key, (buckets, total, count) in self._histograms.items()})
+
+    def drain(self):
+        """ Regresa los valores acumulados y deja el proceso en cero. """
+        with self._lock:
+            snapshot = (self._counters, self._histograms)
+            self._counters, self._histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        counters, histograms = snapshot
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (buckets, total, count) in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+                histogram[2] += count
+
+    def render(self):
+        """ Formato de texto de Prometheus, con la etiqueta `worker` del proceso que responde. """
+        counters, histograms = self.snapshot()
+        worker = ('worker', str(os.getpid()))
+        lines = []
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {PREFIX}{name} counter')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{PREFIX}{name}{_labels(labels + (worker,))} {value}')
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {PREFIX}{name} histogram')
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = labels + (worker,)
+                for bound, bucket_count in zip(BUCKETS, buckets):
+                    lines.append(f'{PREFIX}{name}_bucket{_labels(labels + (("le", str(bound)),))} {bucket_count}')
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+                lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {total}')
+                lines.append(f'{PREFIX}{name}_count{_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+# Métricas del proceso actual
+METRICS = Metrics()
@@ -0,0 +1,202 @@
+import math
+
+import os
+
+import shutil
+
+import tempfile
+
+import threading
+
+from collections import namedtuple
+
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+from .metrics import METRICS
+from .pipeline import PageTextCache, PlainPageText, record_document
+from .pools import process_pool
+from .watermarks import StampPlan
+
+# Documentos con al menos `min_pages` páginas se testan por rangos en `workers` procesos (None: todos los núcleos)
+PageParallel = namedtuple('PageParallel', ['min_pages', 'workers'])
+
+# Un rango más chico no compensa abrir y guardar una parte aparte
+MIN_RANGE_PAGES = 20
+
+# Llaves del catálogo que insert_pdf no copia al unir los rangos: destinos con nombre (y lo demás del
+# árbol /Names, como adjuntos o JavaScript), formularios y etiquetas de página
+STRUCTURE_KEYS = ('Names', 'Dests', 'AcroForm', 'PageLabels')
+
+# Pool de rangos de este proceso, compartido entre peticiones; se recrea si cambia el número de procesos
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+# Procesadores "calientes" de cada proceso del pool, por clase y opciones
+_processors = {}
+
+
+def _init_range_worker():
+    METRICS.drain()
+
+
+def _range_processor(processor_class, options):
+    key = (processor_class, tuple(sorted(options.items())))
+    processor = _processors.get(key)
+    if processor is None:
+        processor = _processors[key] = processor_class(**options)
+    return processor
+
+
+def _process_range(processor_class, options, pdf_path, first, last, is_individual, output_dir):
+    """ Testa las páginas [first, last) y guarda solo esas en un PDF aparte. """
+    try:
+        fd, part_path = tempfile.mkstemp(suffix='.pdf', dir=output_dir)
+        os.close(fd)
+
+        processor = _range_processor(processor_class, options)
+        with fitz.open(pdf_path) as doc:
+            pages = range(first, last)
+            processor.RedactPages(doc, PageTextCache(doc, pages), is_individual, StampPlan())
+
+            with METRICS.stage('split'):
+                doc.select(list(pages))
+                # garbage=1 descarta los objetos de las páginas que no son de este rango
+                doc.save(part_path, garbage=1)
+
+        return part_path, None, METRICS.drain()
+    except Exception as e:
+        return None, e, METRICS.drain()
+
+
+def page_ranges(page_count, workers):
+    """ Rangos contiguos (first, last); dos por proceso para repartir mejor las páginas pesadas. """
+    size = max(MIN_RANGE_PAGES, math.ceil(page_count / (workers * 2)))
+    return [(first, min(first + size, page_count)) for first in range(0, page_count, size)]
+
+
+def document_structure(doc):
+    """
+    Primera estructura a nivel documento que se perdería al unir rangos con
+    insert_pdf (índice, ligas, formularios, destinos con nombre...), o None.
+    """
+    if doc.get_toc(simple=True):
+        return 'toc'
+    catalog = doc.pdf_catalog()
+    for key in STRUCTURE_KEYS:
+        if doc.xref_get_key(catalog, key)[0] != 'null':
+            return key
+    # Una liga puede apuntar a una página de otro rango
+    for page in doc:
+        if page.first_link:
+            return 'links'
+    return None
+
+
+def process_document(processor, pdf_path, output_path, page_parallel=None):
+    """
+    Igual que processor.ProcessPDF, pero si el documento llega a
+    `page_parallel.min_pages` páginas lo testa por rangos en paralelo.
+
+    La clasificación (persona física o moral) se hace antes en este proceso
+    con el texto plano de las páginas; los rangos se testan con las mismas
+    etapas que la corrida en serie (las de la primera página solo en el rango
+    0) y se unen en orden con insert_pdf antes de guardar con processor.Save.
+
+    insert_pdf solo copia páginas, así que un documento con estructura propia
+    (ver document_structure) se testa en serie para que el resultado sea el
+    mismo que el de ProcessPDF.
+    """
+    if not page_parallel or not page_parallel.min_pages:
+        return processor.ProcessPDF(pdf_path, output_path)
+
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+        pool_size = page_parallel.workers or os.cpu_count() or 1
+        workers = min(pool_size, math.ceil(page_count / MIN_RANGE_PAGES))
+        split = page_count >= page_parallel.min_pages and workers > 1
+
+        if split:
+            structure = document_structure(doc)
+            if structure is not None:
+                METRICS.inc('page_parallel_skipped_total', reason=structure)
+                split = False
+
+        if split:
+            with METRICS.stage('classify'):
+                is_individual = processor.DetectKeywords(doc, PlainPageText(doc))['is_individual']
+
+    if not split:
+        return processor.ProcessPDF(pdf_path, output_path)
+
+    name = type(processor).__name__
+    output_dir = tempfile.mkdtemp(prefix='rangos_')
+    try:
+        with METRICS.timer('document_seconds', processor=name):
+            parts = _process_ranges(type(processor), processor.options, pdf_path, page_ranges(page_count, workers), is_individual,
+                                    pool_size, output_dir)
+
+            with fitz.open(parts[0]) as merged:
+                with METRICS.stage('merge'):
+                    for part_path in parts[1:]:
+                        with fitz.open(part_path) as part:
+                            merged.insert_pdf(part)
+
+                with METRICS.stage('save'):
+                    processor.Save(merged, output_path)
+    except Exception:
+        METRICS.inc('documents_failed_total', processor=name)
+        raise
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    record_document(name, pdf_path, output_path, page_count, processor.save_profile)
+
+
+def _range_pool(workers):
+    """ Pool de rangos de este proceso; se crea la primera vez y se reusa en las siguientes peticiones. """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = process_pool(workers, _init_range_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(executor):
+    """ Descarta un pool roto (un hijo murió) para que la siguiente petición cree otro. """
+    global _pool
+    with _pool_lock:
+        if _pool is executor:
+            _pool = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _process_ranges(processor_class, options, pdf_path, ranges, is_individual, pool_size, output_dir):
+    executor = _range_pool(pool_size)
+    futures = []
+    try:
+        futures = [executor.submit(_process_range, processor_class, options, pdf_path, first, last, is_individual,
+                                   output_dir)
+                   for first, last in ranges]
+
+        parts = []
+        for future in futures:
+            part_path, error, metrics = future.result()
+            METRICS.merge(metrics)
+            if error is not None:
+                raise error
+            parts.append(part_path)
+        return parts
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        raise
+    finally:
+        # Si un rango falló, los demás de esta petición ya no hacen falta
+        for future in futures:
+            future.cancel()
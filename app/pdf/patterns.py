@@ -0,0 +1,74 @@
+import re
+
+from collections.abc import Mapping
+
+# Versión del conjunto de reglas; forma parte de la llave de la caché de resultados
+PATTERNS_VERSION = 1
+
+# Patrones que comparten varios tipos de documento
+CURP = r'\b[A-Z]{4}\d{6}[HM]\d{2}[A-Z]{3}[A-Z\d]\b'
+RFC = r'\b[A-ZÑ&]{3,4}-?\d{2}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])[-]?[A-Z\d]{2}[A\d]\b'
+EMAIL = r'\s*(CORREO:|Correo electrónico:)\s*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
+PHONE = r'(?:Teléfono:|\sTEL:)\s*(?:\+52\s*|\s*52\s*)?\(?\d+\)?(?:[\s-]?\d+)*(?:\s*(?:,\s*|\sy\s*)\s*(?:\+52\s*|\s*52\s*)?\(?\d+\)?(?:[\s-]?\d+)*)*'
+
+
+class RuleSet(Mapping):
+    """
+    Reglas de un tipo de documento, compiladas una sola vez por proceso.
+
+    Se usa como un dict {nombre: patrón compilado}. `scan` recorre el texto una
+    vez por regla (un finditer cada una) y junta las coincidencias en orden de
+    aparición, así que su costo crece con el número de reglas. Unirlas en una
+    alternancia no lo mejora con `re`: prueba las alternativas una por una en
+    cada posición y pierde el salto por prefijo literal de cada patrón, así
+    que sale más lento.
+    """
+
+    def __init__(self, rules, flags=0):
+        self._patterns = {name: re.compile(pattern, flags) for name, pattern in rules.items()}
+
+    def __getitem__(self, name):
+        return self._patterns[name]
+
+    def __iter__(self):
+        return iter(self._patterns)
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def scan(self, text):
+        """ Lista de (nombre_de_regla, match) de todas las reglas, en orden de aparición; un finditer por regla. """
+        found = [(name, match) for name, pattern in self._patterns.items() for match in pattern.finditer(text)]
+        found.sort(key=lambda item: item[1].start())
+        return found
+
+
+# Reglas por tipo de documento, compiladas una sola vez por proceso
+RULE_SETS = {
+    'residuos_corporate': RuleSet({
+        'Addresses': r'(?<=\sC\.V\.)\s+(?!Ubicación de la instalación)([^,]+),\s*([^,]+),\s*([^,]+),\s*([^,]+)\s*([^\.]+)\.',
+        'EmailAddresses': EMAIL,
+        'PhoneNumber': PHONE,
+        'CURP': CURP,
+        'RFC': RFC,
+    }),
+    'residuos_individual': RuleSet({
+        'IndividualNames': r'C\.\s([A-ZÁÉÍÓÚÑ][a-záéíóúñÁÉÍÓÚÑ]*(\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñÁÉÍÓÚÑ]*)*)\s*((?=Ubicación de la instalación)|(?:Persona física con actividad empresarial)|(?=\s\s))',
+        'EmailAddresses': EMAIL,
+        'PhoneNumber': PHONE,
+        'CURP': CURP,
+        'RFC': RFC,
+        'IndividualAddresses': r'(?<=Persona física con actividad empresarial)\s+(?!Ubicación de la instalación)([^,]+),\s*([^,]+),\s*([^,]+),\s*([^,]+)\s*([^\.]+)\.',
+    }),
+    'impacto': RuleSet({
+        'rfc': r'(?:R[e|i]g[i|s]st[r|i|o]o Federal de Contribuyentes)\s*(\w+\s*\d*)',
+        'ine': r'(?:Instituto Naciona[l|i] Electora[l|i] con c[l|i]ave)\s*(\w+\s*\d*)',
+        'repPropia': r'(?:C\.)\s[A-Za-záéíóúñÑ\s]+,\s*(?:en representacion)',
+        'acredita': r'(?:C\.)\s([A-Za-záéíóúñÑ\s]+)(?=\s*acredita)',
+    }, re.IGNORECASE | re.MULTILINE),
+    'atmosfera_corporate': RuleSet({}),
+    'atmosfera_individual': RuleSet({
+        'ApplicantName': r'(?<=por medio de la cual la)\s+(C\.\s*)+([A-Z][a-z]*(?:\s+[A-Z][a-z]*)*)+',
+        'LegalPersonalityName': r'(?<=personalidad jurídica de la)\s+(C\.\s*)+([A-Z][a-z]*(?:\s+[A-Z][a-z]*)+)',
+    }),
+}
@@ -0,0 +1,294 @@
+import os
+
+import fitz
+
+from . import patterns
+from .DeleteQR import QR_WATERMARK, remove_qr_codes, remove_qr_images
+from .metrics import METRICS
+from .textindex import PageTextIndex
+from .watermarks import StampPlan
+
+# Perfiles de guardado: fast no limpia nada (archivos sueltos, interactivo), compact recolecta y
+# deduplica objetos y comprime los streams (lotes y ZIPs), web además linealiza para ver el PDF
+# conforme se descarga
+SAVE_PROFILES = {
+    'fast': {},
+    'compact': {'garbage': 4, 'deflate': True, 'deflate_fonts': True, 'use_objstms': 1},
+    'web': {'garbage': 3, 'deflate': True, 'linear': True},
+}
+DEFAULT_SAVE_PROFILE = 'fast'
+
+
+class PageTextCache:
+    """
+    Índice de texto por página, extraído una sola vez y compartido por todas las etapas.
+
+    El índice de una página se descarta cuando se le aplican redacciones, porque
+    a partir de ahí su texto cambia. `pages` son las páginas que le tocan a
+    esta corrida: todas, o un rango cuando el documento se procesa por partes.
+    `on_pages(n)` (si hay) se llama con cada página que termina de testarse.
+    """
+
+    def __init__(self, doc, pages=None, on_pages=None):
+        self.doc = doc
+        self.pages = range(len(doc)) if pages is None else pages
+        self.on_pages = on_pages
+        self._indexes = {}
+        self._finished = set()
+
+    def index(self, page_num):
+        index = self._indexes.get(page_num)
+        if index is None:
+            with METRICS.stage('extract'):
+                index = PageTextIndex(self.doc[page_num])
+            self._indexes[page_num] = index
+        return index
+
+    def text(self, page_num):
+        return self.index(page_num).text
+
+    def matched(self, page_num, matches):
+        """ Lo llama FindMatches con las coincidencias de cada página. """
+        for pattern_name, _ in matches:
+            METRICS.inc('matches_total', rule=pattern_name)
+
+    def apply_redactions(self, page_num):
+        page = self.doc[page_num]
+        count = sum(1 for _ in page.annots(types=[fitz.PDF_ANNOT_REDACT]))
+        if count:
+            with METRICS.stage('apply_redactions'):
+                page.apply_redactions()
+            METRICS.inc('redactions_total', count)
+        self._indexes.pop(page_num, None)
+        if page_num not in self._finished:
+            self._finished.add(page_num)
+            if self.on_pages is not None:
+                self.on_pages(1)
+
+    def finish(self):
+        """ Da por terminadas las páginas del rango que ninguna etapa testó (p. ej. sin reglas que buscar). """
+        remaining = [page_num for page_num in self.pages if page_num not in self._finished]
+        self._finished.update(remaining)
+        if remaining and self.on_pages is not None:
+            self.on_pages(len(remaining))
+
+
+class PreviewPageText(PageTextCache):
+    """
+    PageTextCache de la vista previa: anota las coincidencias de cada página y,
+    en lugar de aplicar las redacciones, guarda sus rectángulos y quita las
+    anotaciones. El texto nunca cambia, así que cada página se extrae una vez
+    (a diferencia del testado real, las coincidencias de la primera página
+    incluyen el texto que se testa por coordenadas).
+    """
+
+    def __init__(self, doc, pages=None):
+        super().__init__(doc, pages)
+        self.matches = []
+        self.redactions = []
+
+    def matched(self, page_num, matches):
+        index = self.index(page_num)
+        for pattern_name, match in matches:
+            self.matches.append({'page': page_num + 1, 'rule': pattern_name, 'text': match.group().strip(),
+                                 'rects': [_rounded(rect) for rect in index.match_rects(match)]})
+
+    def apply_redactions(self, page_num):
+        page = self.doc[page_num]
+        xrefs = [annot.xref for annot in page.annots(types=[fitz.PDF_ANNOT_REDACT])]
+        for xref in xrefs:
+            annot = page.load_annot(xref)
+            self.redactions.append({'page': page_num + 1, 'rect': _rounded(annot.rect)})
+            page.delete_annot(annot)
+
+
+def _rounded(rect):
+    return [round(coord, 1) for coord in rect]
+
+
+class PlainPageText:
+    """
+    Solo el texto de cada página, sin cajas; para clasificar un documento sin
+    pagar la extracción completa (se usa cuando las páginas se testan en otro proceso).
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    def text(self, page_num):
+        with METRICS.stage('extract'):
+            return self.doc[page_num].get_text("text")
+
+
+class RedactionPipeline:
+    """
+    Base de los procesadores de testado.
+
+    ProcessPDF abre el documento una sola vez y corre las etapas en orden:
+    clasificar → testar por coordenadas → testar por patrones → (quitar QR)
+    → marcas de agua → guardar. Cada procesador sobreescribe las etapas que le
+    aplican.
+
+    Las opciones del constructor (`delete_qr`, `qr_detector`, `save_profile`)
+    cambian el resultado, así que `options` las expone para recrear el
+    procesador en otro proceso y para la llave de la caché.
+
+    `page_progress(n)`, si se asigna, recibe las páginas que ProcessPDF va
+    terminando (la usa progress.PageProgress para el avance de los lotes).
+    """
+
+    page_progress = None
+
+    PATTERNS_VERSION = patterns.PATTERNS_VERSION
+
+    # Versión de cómo se arma el PDF testado (rectángulos de cada coincidencia, marcas, etapas), aparte
+    # del texto de los patrones; va en la llave de la caché. Se sube con cada cambio que altere la salida
+    # (2: rectángulos desde el índice de texto, las reglas de cada página juntas antes de testarla, sin marcas
+    # laterales repetidas)
+    OUTPUT_VERSION = 2
+
+    def __init__(self, delete_qr=False, qr_detector=None, save_profile=None):
+        if save_profile is not None and save_profile not in SAVE_PROFILES:
+            raise ValueError(f'Perfil de guardado desconocido: {save_profile}')
+        self.delete_qr = delete_qr
+        self.qr_detector = qr_detector
+        self.save_profile = save_profile or DEFAULT_SAVE_PROFILE
+
+    @property
+    def options(self):
+        # Sin delete_qr el detector no cambia nada, y el perfil por omisión es el guardado de siempre;
+        # así no separan entradas de la caché
+        return {'delete_qr': self.delete_qr, 'qr_detector': self.qr_detector if self.delete_qr else None,
+                'save_profile': self.save_profile if self.save_profile != DEFAULT_SAVE_PROFILE else None}
+
+    # Texto que identifica a una persona física; con encontrarlo en una página basta
+    KEYWORD_INDIVIDUAL = "Persona física"
+
+    def DetectKeywords(self, doc, texts):
+        is_individual = any(self.KEYWORD_INDIVIDUAL in texts.text(page_num) for page_num in range(len(doc)))
+        return {'is_individual': is_individual, 'is_corporate': not is_individual}
+
+    def FindMatches(self, rules, texts, page_num):
+        """ Coincidencias (nombre de regla, match) de un RuleSet sobre el texto de una página (ver RuleSet.scan). """
+        text = texts.text(page_num)
+        with METRICS.stage('scan'):
+            matches = rules.scan(text)
+        texts.matched(page_num, matches)
+        return matches
+
+    def DeleteTextByCoordinate(self, doc, texts, is_individual):
+        pass
+
+    def RedactMatches(self, doc, texts, is_individual, stamps):
+        pass
+
+    def AddWatermark(self, stamps, is_individual):
+        pass
+
+    def DeleteQR(self, doc, texts, stamps):
+        """
+        Quita los QR (ver DeleteQR.py) y les pone su leyenda. Con `qr_detector`
+        se buscan en todas las páginas del rango decodificando las candidatas;
+        sin él, solo en la última página por su posición.
+        """
+        last_page = len(doc) - 1
+        if self.qr_detector:
+            pages = remove_qr_codes(doc, texts.pages, self.qr_detector)
+        elif last_page in texts.pages and remove_qr_images(doc, last_page):
+            pages = [last_page]
+        else:
+            pages = []
+
+        for page_num in pages:
+            stamps.add(page_num, QR_WATERMARK)
+
+    def Save(self, doc, output_path):
+        """ Guarda con las opciones del perfil (ver SAVE_PROFILES). """
+        settings = SAVE_PROFILES[self.save_profile]
+        try:
+            doc.save(output_path, **settings)
+        except Exception:
+            # MuPDF 1.26 en adelante ya no linealiza (FzErrorArgument); se guarda igual, sin linealizar
+            if not settings.get('linear'):
+                raise
+            METRICS.inc('save_fallbacks_total', profile=self.save_profile)
+            if not isinstance(output_path, (str, os.PathLike)):
+                output_path.seek(0)
+                output_path.truncate()
+            doc.save(output_path, **{name: value for name, value in settings.items() if name != 'linear'})
+
+    def RedactPages(self, doc, texts, is_individual, stamps):
+        """
+        Etapas que se pueden correr por rango de páginas (texts.pages); las de la
+        primera página solo corren en el rango que la incluye.
+        """
+        first_page = 0 in texts.pages
+
+        if first_page:
+            with METRICS.stage('coordinates'):
+                self.DeleteTextByCoordinate(doc, texts, is_individual)
+        with METRICS.stage('patterns'):
+            self.RedactMatches(doc, texts, is_individual, stamps)
+        if self.delete_qr:
+            self.DeleteQR(doc, texts, stamps)
+        with METRICS.stage('watermark'):
+            if first_page:
+                self.AddWatermark(stamps, is_individual)
+            stamps.apply(doc)
+        texts.finish()
+
+    def ProcessPDF(self, pdf_path, output_path):
+        processor = type(self).__name__
+        try:
+            with METRICS.timer('document_seconds', processor=processor), fitz.open(pdf_path) as doc:
+                texts = PageTextCache(doc, on_pages=self.page_progress)
+
+                with METRICS.stage('classify'):
+                    is_individual = self.DetectKeywords(doc, texts)['is_individual']
+                self.RedactPages(doc, texts, is_individual, StampPlan())
+                with METRICS.stage('save'):
+                    self.Save(doc, output_path)
+
+                page_count = len(doc)
+        except Exception:
+            METRICS.inc('documents_failed_total', processor=processor)
+            raise
+
+        record_document(processor, pdf_path, output_path, page_count, self.save_profile)
+
+    def Preview(self, pdf_path):
+        """
+        Lo que testaría ProcessPDF, sin testar: clasifica y corre las etapas
+        por coordenadas y por patrones sobre una PreviewPageText. Nunca aplica
+        redacciones, pone marcas de agua, quita QR ni guarda.
+
+        Regresa un dict con el procesador, las páginas, si es persona física,
+        las coincidencias (página desde 1, regla, texto y rectángulos) y los
+        rectángulos que se testarían.
+        """
+        processor = type(self).__name__
+        with METRICS.timer('preview_seconds', processor=processor), fitz.open(pdf_path) as doc:
+            texts = PreviewPageText(doc)
+            is_individual = self.DetectKeywords(doc, texts)['is_individual']
+            self.DeleteTextByCoordinate(doc, texts, is_individual)
+            self.RedactMatches(doc, texts, is_individual, StampPlan())
+            page_count = len(doc)
+
+        METRICS.inc('previews_total', processor=processor)
+        return {'processor': processor, 'pages': page_count, 'is_individual': is_individual,
+                'matches': texts.matches, 'redactions': texts.redactions}
+
+
+def record_document(processor, pdf_path, output_path, page_count, save_profile=DEFAULT_SAVE_PROFILE):
+    METRICS.inc('documents_total', processor=processor)
+    METRICS.inc('pages_total', page_count, processor=processor)
+    METRICS.inc('bytes_in_total', os.path.getsize(pdf_path))
+    METRICS.inc('bytes_out_total', output_size(output_path), profile=save_profile)
+
+def output_size(output_path):
+    if isinstance(output_path, (str, os.PathLike)):
+        return os.path.getsize(output_path)
+    position = output_path.tell()
+    size = output_path.seek(0, os.SEEK_END)
+    output_path.seek(position)
+    return size
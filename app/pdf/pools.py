@@ -0,0 +1,26 @@
+"""
+Pools de procesos del testado (lotes, vista previa, inspección y rangos de páginas).
+
+Todos se crean aquí con el contexto `forkserver`. Con el `fork` por omisión,
+cada hijo copia al proceso de gunicorn tal como está en ese momento, también
+los candados que otro hilo (una petición, otro trabajo de la cola) tenga
+tomados: el de METRICS, el de QRCache, los internos de MuPDF o de sqlite. Un
+hijo que hereda un candado tomado se queda colgado para siempre. Con
+forkserver los hijos salen de un proceso servidor de un solo hilo que ya
+importó los módulos del testado, así que arrancan limpios y casi igual de rápido.
+"""
+
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+POOL_CONTEXT = multiprocessing.get_context('forkserver')
+
+# Lo que el servidor importa una sola vez y heredan todos los hijos
+POOL_CONTEXT.set_forkserver_preload([f'{__package__}.batch', f'{__package__}.parallel'])
+
+
+def process_pool(workers, initializer=None, initargs=()):
+    """ ProcessPoolExecutor de `workers` procesos sobre forkserver. """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT, initializer=initializer,
+                               initargs=initargs)
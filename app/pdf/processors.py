@@ -0,0 +1,24 @@
+import os
+
+from .TestadoResiduosPeligrosos import TestarResiduosPeligrosos
+from .TestadoImpactoAmbiental import TestarImpactoAmbiental
+from .TestadoAtmosfera import TestarAtmosefera
+
+# Procesadores disponibles por tipo de documento y el sufijo de su archivo de salida
+PROCESSORS = {
+    'residuos': (TestarResiduosPeligrosos, '_testado.pdf'),
+    'impacto': (TestarImpactoAmbiental, '_impacto_testado.pdf'),
+    'atmosfera': (TestarAtmosefera, '_atmosfera_testado.pdf'),
+}
+
+# Tipo para lotes mixtos: cada archivo va al procesador de su tipo detectado (ver classify.py)
+AUTO = 'auto'
+
+
+def get_processor_class(kind):
+    return PROCESSORS[kind][0]
+
+
+def output_name(kind, filename):
+    """ Nombre de descarga del PDF testado, p. ej. 'resolucion.pdf' -> 'resolucion_impacto_testado.pdf'. """
+    return f'{os.path.splitext(filename)[0]}{PROCESSORS[kind][1]}'
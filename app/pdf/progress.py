@@ -0,0 +1,196 @@
+"""
+Avance de los lotes de "Procesar Todos".
+
+El ZIP de un lote lo genera el proceso de gunicorn que recibió el POST y las
+páginas las testan los procesos del pool, pero el navegador consulta el avance
+en cualquier otro worker; por eso el avance vive en SQLite (igual que la cola
+de trabajos). El navegador lo pide cada segundo (GET corto a /progress/<id>)
+en lugar de tener una conexión abierta que ocuparía un worker síncrono.
+"""
+
+import json
+
+import os
+
+import re
+
+import sqlite3
+
+import time
+
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    files_done INTEGER NOT NULL DEFAULT 0,
+    files_total INTEGER NOT NULL,
+    pages_total INTEGER NOT NULL,
+    current_file TEXT,
+    errors TEXT NOT NULL DEFAULT '[]',
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_pages (
+    batch_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    pages_done INTEGER NOT NULL,
+    PRIMARY KEY (batch_id, filename)
+);
+"""
+
+RUNNING, DONE, FAILED = 'running', 'done', 'error'
+
+# Los ids los genera el navegador; solo se aceptan los que parecen un uuid
+BATCH_ID = re.compile(r'^[0-9a-f-]{8,64}$')
+
+
+def valid_batch_id(batch_id):
+    return bool(batch_id) and BATCH_ID.match(batch_id) is not None
+
+
+class BatchProgress:
+    """
+    Archivos y páginas terminados, archivo en curso y errores de cada lote.
+
+    Las páginas se cuentan por archivo: las va sumando el pipeline conforme las
+    testa (ver PageProgress) y al terminar el archivo se fijan en su total,
+    así que un archivo que sale de la caché o que falla a la mitad cuenta igual.
+    """
+
+    def __init__(self, db_path, retention=24 * 3600):
+        self.db_path = db_path
+        self.retention = retention
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self, batch_id, files_total, pages_total):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('DELETE FROM batches WHERE updated_at < ?', (now - self.retention,))
+            conn.execute('DELETE FROM batch_pages WHERE batch_id = ? OR batch_id NOT IN (SELECT id FROM batches)',
+                         (batch_id,))
+            conn.execute(
+                'INSERT OR REPLACE INTO batches (id, status, files_total, pages_total, started_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (batch_id, RUNNING, files_total, pages_total, now, now),
+            )
+
+    def pages_done(self, batch_id, filename, pages):
+        """ Suma páginas testadas de un archivo que sigue en proceso. """
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO batch_pages (batch_id, filename, pages_done) VALUES (?, ?, ?) '
+                'ON CONFLICT (batch_id, filename) DO UPDATE SET pages_done = pages_done + excluded.pages_done',
+                (batch_id, filename, pages),
+            )
+            conn.execute('UPDATE batches SET current_file = ?, updated_at = ? WHERE id = ?',
+                         (filename, time.time(), batch_id))
+
+    def file_done(self, batch_id, filename, pages, error=None):
+        """ Suma un archivo terminado (con o sin error); sus páginas quedan en `pages`. """
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT errors FROM batches WHERE id = ?', (batch_id,)).fetchone()
+            if row is None:
+                return
+            errors = json.loads(row[0])
+            if error is not None:
+                errors.append({'file': filename, 'error': str(error)})
+            conn.execute('INSERT OR REPLACE INTO batch_pages (batch_id, filename, pages_done) VALUES (?, ?, ?)',
+                         (batch_id, filename, pages))
+            conn.execute(
+                'UPDATE batches SET files_done = files_done + 1, current_file = ?, errors = ?, updated_at = ? '
+                'WHERE id = ?',
+                (filename, json.dumps(errors), time.time(), batch_id),
+            )
+
+    def finish(self, batch_id, status=DONE):
+        with self._connect() as conn:
+            conn.execute('UPDATE batches SET status = ?, current_file = NULL, updated_at = ? WHERE id = ?',
+                         (status, time.time(), batch_id))
+
+    def get(self, batch_id):
+        """ Estado del lote con tiempo transcurrido y ETA (por páginas), o None si no existe. """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                'SELECT *, (SELECT COALESCE(SUM(pages_done), 0) FROM batch_pages WHERE batch_id = batches.id) AS pages_done '
+                'FROM batches WHERE id = ?', (batch_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        state = dict(row)
+        state['errors'] = json.loads(state['errors'])
+        end = state['updated_at'] if state['status'] != RUNNING else time.time()
+        state['elapsed'] = round(end - state['started_at'], 1)
+        state['eta'] = _eta(state)
+        return state
+
+
+def _eta(state):
+    if state['status'] != RUNNING:
+        return 0
+    # Sin páginas conocidas se estima por archivos
+    done, total = ((state['pages_done'], state['pages_total']) if state['pages_total']
+                   else (state['files_done'], state['files_total']))
+    if not done:
+        return None
+    return round(state['elapsed'] / done * (total - done), 1)
+
+
+class PageProgress:
+    """
+    Lo que necesita un proceso del pool para sumar al lote las páginas que va
+    testando: `track` le pone a un procesador una función `page_progress`
+    (ver RedactionPipeline) mientras testa un archivo. Para no escribir en la
+    base por cada página, junta las páginas y las escribe a lo más cada
+    `interval` segundos y al terminar el archivo.
+
+    `progress` es cualquier objeto con `pages_done(id, archivo, páginas)`: un
+    BatchProgress para los lotes o un jobs.JobPages para la cola de trabajos.
+    """
+
+    def __init__(self, progress, batch_id, interval=0.5):
+        self.progress = progress
+        self.batch_id = batch_id
+        self.interval = interval
+
+    @contextmanager
+    def track(self, processor, filename):
+        pending = 0
+        last_write = time.monotonic()
+
+        def flush():
+            nonlocal pending, last_write
+            if pending:
+                self.progress.pages_done(self.batch_id, filename, pending)
+            pending = 0
+            last_write = time.monotonic()
+
+        def page_progress(pages):
+            nonlocal pending
+            pending += pages
+            if time.monotonic() - last_write >= self.interval:
+                flush()
+
+        processor.page_progress = page_progress
+        try:
+            yield
+        finally:
+            processor.page_progress = None
+            flush()
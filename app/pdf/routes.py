@@ -1,19 +1,42 @@
-from flask import Blueprint, render_template, request, redirect, url_for, send_file, send_from_directory
-from flask import send_file
+from flask import Blueprint, render_template, request, redirect, url_for, send_file, send_from_directory, current_app, Response, jsonify, g
 
 import os
 
-import io
+import itertools
+
+import json
+
+import shutil
+
+import tempfile
+
+import time
 
 from .TestadoResiduosPeligrosos import TestarResiduosPeligrosos
 from .TestadoImpactoAmbiental import TestarImpactoAmbiental
 from .TestadoAtmosfera import TestarAtmosefera
-
-import zipfile
+from .batch import process_routed, preview_routed
+from .zipstream import stream_zip
+from .jobs import JobQueue, DONE
+from .processors import PROCESSORS, AUTO, get_processor_class, output_name
+from .classify import route_files
+from .cache import ResultCache, process_cached
+from .parallel import PageParallel
+from .pipeline import SAVE_PROFILES, DEFAULT_SAVE_PROFILE, output_size
+from .spool import SpooledOutput, DEFAULT_SPOOL_BYTES
+from .uploads import ChunkedUploads, UploadError
+from .bulk import BulkUpload, ZIP_MAX_BYTES, ZIP_MAX_ENTRIES
+from .documents import DocumentIndex, SORT_COLUMNS
+from .metrics import METRICS
+from .progress import BatchProgress, PageProgress, DONE as BATCH_DONE, FAILED as BATCH_FAILED, valid_batch_id
 
 pdf_bp = Blueprint('pdf', __name__, template_folder='templates/pdf')
 
 UPLOAD_FOLDER = os.path.abspath('app/uploads')
+JOBS_FOLDER = os.path.abspath('app/jobs')
+CACHE_FOLDER = os.path.abspath('app/cache')
+PARTIAL_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, '.partial')
+DOCUMENT_INDEX_PATH = os.path.abspath('app/index/documents.sqlite3')
 ALLOWED_EXTENSIONS = {'pdf'}
 
 if not os.path.exists(UPLOAD_FOLDER):
@@ -26,32 +49,41 @@ def allowed_file(filename):
 @pdf_bp.route('/')
 def index():
     """ Ruta principal para mostrar la lista de archivos PDF en index.html. """
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    return render_template('index.html', files=files)
+    return render_documents('index.html')
 
 @pdf_bp.route('/residuos-peligrosos')
 def residuos_peligrosos():
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    file_count = len(files)
-    return render_template('DragAndDrop.html', files=files, file_count=file_count)
+    return render_documents('DragAndDrop.html')
 
 @pdf_bp.route('/impacto-ambiental')
 def impacto_ambiental():
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    file_count = len(files)
-    return render_template('DragAndDrop.html', files=files, file_count=file_count)
+    return render_documents('DragAndDrop.html')
 
 @pdf_bp.route('/atmosfera')
 def atmosfera():
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    file_count = len(files)
-    return render_template('DragAndDrop.html', files=files, file_count=file_count)
+    return render_documents('DragAndDrop.html')
 
 @pdf_bp.route('/permisos')
 def permisos():
     """ Ruta alternativa para mostrar la lista de archivos PDF subidos en DragAndDrop.html. """
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    return render_template('DragAndDrop.html', files=files)
+    return render_documents('DragAndDrop.html')
+
+def render_documents(template):
+    """ Página del listado de archivos subidos, desde el índice; acepta ?page=, ?sort= y ?order=asc|desc. """
+    documents_index = get_document_index()
+    per_page = current_app.config.get('DOCUMENTS_PER_PAGE', 100)
+    sort = request.args.get('sort', 'filename')
+    if sort not in SORT_COLUMNS:
+        sort = 'filename'
+    order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+
+    file_count = documents_index.count()
+    page_count = max(1, -(-file_count // per_page))
+    page = min(max(request.args.get('page', 1, type=int), 1), page_count)
+    documents = documents_index.list((page - 1) * per_page, per_page, sort, order == 'desc')
+
+    return render_template(template, files=[doc['filename'] for doc in documents], documents=documents,
+                           file_count=file_count, page=page, page_count=page_count, sort=sort, order=order)
 
 @pdf_bp.route('/upload', methods=['POST'])
 def upload():
@@ -62,60 +94,141 @@ def upload():
     if file.filename == '':
         return redirect(request.url)
     if file and allowed_file(file.filename):
-        filename = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(filename)
+        try:
+            get_chunked_uploads().save_stream(file.filename, file.stream)
+        except UploadError as e:
+            print(f"Error al subir el archivo: {e}")
+            return redirect(request.url)
         return redirect(url_for('pdf.residuos_peligrosos'))
     return redirect(request.url)
 
+@pdf_bp.route('/upload/<filename>', methods=['PUT'])
+def upload_stream(filename):
+    """ Subida con el PDF como cuerpo de la petición; se escribe a disco conforme llega. """
+    try:
+        return jsonify(get_chunked_uploads().save_stream(filename, request.stream)), 201
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
+@pdf_bp.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """ Varios PDF en un multipart, o un ZIP (como archivo del multipart o como cuerpo); regresa un resumen en JSON. """
+    config = current_app.config
+    bulk = BulkUpload(get_chunked_uploads(), workers=config.get('BULK_UPLOAD_WORKERS', 8),
+                      zip_max_entries=config.get('BULK_ZIP_MAX_ENTRIES', ZIP_MAX_ENTRIES),
+                      zip_max_bytes=config.get('BULK_ZIP_MAX_BYTES', ZIP_MAX_BYTES))
+    try:
+        return jsonify(bulk.ingest(request.content_type, request.stream))
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
+@pdf_bp.route('/upload/chunked', methods=['POST'])
+def create_chunked_upload():
+    """ Inicia una subida por partes; el JSON (o formulario) trae `filename` y `size`. """
+    data = request.get_json(silent=True) or request.form
+    try:
+        state = get_chunked_uploads().create(data.get('filename'), data.get('size'))
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
+    state['chunk_size'] = current_app.config.get('UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024)
+    state['upload_url'] = url_for('pdf.chunked_upload', upload_id=state['upload_id'])
+    return jsonify(state), 201
+
+@pdf_bp.route('/upload/chunked/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+def chunked_upload(upload_id):
+    """
+    GET: cuánto se ha recibido (para reanudar). PATCH: agrega la parte del
+    cuerpo en el offset del encabezado Upload-Offset. DELETE: cancela.
+    """
+    uploads = get_chunked_uploads()
+    try:
+        if request.method == 'GET':
+            return jsonify(uploads.status(upload_id))
+        if request.method == 'DELETE':
+            uploads.cancel(upload_id)
+            return '', 204
+
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return jsonify({'error': 'Falta el encabezado Upload-Offset'}), 400
+        return jsonify(uploads.append(upload_id, offset, request.stream))
+    except UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
 @pdf_bp.route('/uploads/<filename>')
 def uploaded_file(filename):
     """ Ruta para servir archivos PDF subidos. """
     return send_from_directory(UPLOAD_FOLDER, filename)
 
+def new_output():
+    """ Salida de un testado individual: en memoria hasta OUTPUT_SPOOL_BYTES y después en un temporal en disco. """
+    return SpooledOutput(current_app.config.get('OUTPUT_SPOOL_BYTES', DEFAULT_SPOOL_BYTES),
+                         current_app.config.get('OUTPUT_SPOOL_FOLDER'))
+
+def send_output(output, download_name, processor):
+    """
+    El PDF testado como descarga; los encabezados dicen con qué perfil se
+    guardó y cuánto pesa. La respuesta se queda con el archivo de `output` y
+    lo cierra al terminar de mandarlo (si está en disco, con sendfile).
+    """
+    size = output_size(output)
+    response = send_file(output.detach(), as_attachment=True, download_name=download_name, mimetype='application/pdf')
+    response.content_length = size
+    response.headers['X-Save-Profile'] = processor.save_profile
+    response.headers['X-Output-Bytes'] = str(size)
+    return response
+
 @pdf_bp.route('/testar-residuos/<filename>', methods=['POST'])
 def testar_residuos(filename):
+    output = new_output()
     try:
-        output = io.BytesIO()
-        processor = TestarResiduosPeligrosos()
-        processor.ProcessPDF(os.path.join(UPLOAD_FOLDER, filename), output)
-        output.seek(0)
+        processor = TestarResiduosPeligrosos(**processor_options(save_profile()))
+        process_cached(processor, os.path.join(UPLOAD_FOLDER, filename), output, get_result_cache(), get_page_parallel())
+        get_document_index().record_result(filename, type(processor).__name__)
 
-        return send_file(output, as_attachment=True, download_name=f'{os.path.splitext(filename)[0]}_testado.pdf', mimetype='application/pdf')
+        return send_output(output, f'{os.path.splitext(filename)[0]}_testado.pdf', processor)
     
     except Exception as e:
         print(f"Error al procesar el archivo: {e}")
+        get_document_index().record_result(filename, 'TestarResiduosPeligrosos', e)
         return redirect(url_for('pdf.residuos_peligrosos'))
+    finally:
+        output.close()
  
 @pdf_bp.route('/testar-impacto/<filename>', methods=['POST'])
 def testar_impacto(filename):
+    output = new_output()
     try:
-        output = io.BytesIO()
-        processor = TestarImpactoAmbiental()
-        processor.ProcessPDF(os.path.join(UPLOAD_FOLDER, filename), output)
+        processor = TestarImpactoAmbiental(**processor_options(save_profile()))
+        process_cached(processor, os.path.join(UPLOAD_FOLDER, filename), output, get_result_cache(), get_page_parallel())
+        get_document_index().record_result(filename, type(processor).__name__)
 
-        output.seek(0)
-
-        return send_file(output, as_attachment=True, download_name=f'{os.path.splitext(filename)[0]}_impacto_testado.pdf', mimetype='application/pdf')
+        return send_output(output, f'{os.path.splitext(filename)[0]}_impacto_testado.pdf', processor)
 
     except Exception as e:
         print(f"Error al procesar el archivo: {e}")
+        get_document_index().record_result(filename, 'TestarImpactoAmbiental', e)
         return redirect(url_for('pdf.impacto_ambiental'))
+    finally:
+        output.close()
 
 @pdf_bp.route('/testar-atmosfera/<filename>', methods=['POST'])
 def testar_atmosfera(filename):
+    output = new_output()
     try:
-        output = io.BytesIO()
-
-        processor = TestarAtmosefera()
-        processor.ProcessPDF(os.path.join(UPLOAD_FOLDER, filename), output)
+        processor = TestarAtmosefera(**processor_options(save_profile()))
+        process_cached(processor, os.path.join(UPLOAD_FOLDER, filename), output, get_result_cache(), get_page_parallel())
+        get_document_index().record_result(filename, type(processor).__name__)
 
-        output.seek(0)
-
-        return send_file(output, as_attachment=True, download_name=f'{os.path.splitext(filename)[0]}_atmosfera_testado.pdf', mimetype='application/pdf')
+        return send_output(output, f'{os.path.splitext(filename)[0]}_atmosfera_testado.pdf', processor)
 
     except Exception as e:
         print(f"Error al procesar el archivo: {e}")
+        get_document_index().record_result(filename, 'TestarAtmosefera', e)
         return redirect(url_for('pdf.atmosfera'))
+    finally:
+        output.close()
 
 @pdf_bp.route('/delete/<filename>', methods=['POST'])
 def delete(filename):
@@ -127,49 +240,384 @@ def delete(filename):
             print(f"Archivo eliminado: {file_path}")
         except Exception as e:
             print(f"Error al eliminar el archivo: {e}")
+    if not os.path.exists(file_path):
+        get_document_index().remove(filename)
 
     current_route = request.form.get('current_route', 'pdf.residuos_peligrosos') 
     return redirect(url_for(current_route))
 
 @pdf_bp.route('/process_all_residuos', methods=['POST'])
 def process_all_residuos():
-    return process_all(TestarResiduosPeligrosos, 'pdf.residuos_peligrosos')
+    return process_all(TestarResiduosPeligrosos)
 
 @pdf_bp.route('/process_all_impacto', methods=['POST'])
 def process_all_impacto():
-    return process_all(TestarImpactoAmbiental, 'pdf.impacto_ambiental')
+    return process_all(TestarImpactoAmbiental)
 
 @pdf_bp.route('/process_all_atmosfera', methods=['POST'])
 def process_all_atmosfera():
-    return process_all(TestarAtmosefera, 'pdf.atmosfera')
-
-def process_all(processor_class, current_route):
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    zip_output = io.BytesIO()
+    return process_all(TestarAtmosefera)
+
+@pdf_bp.route('/process_all_auto', methods=['POST'])
+def process_all_auto():
+    """
+    "Procesar Todos" para un lote mixto: cada archivo se testa con el
+    procesador de su tipo detectado. Los de tipo dudoso no se testan; el ZIP
+    trae clasificacion.json con el tipo de cada archivo y los que hay que revisar.
+    """
+    documents_index = get_document_index()
+    pdf_paths = [os.path.join(UPLOAD_FOLDER, filename) for filename in documents_index.filenames()]
+    routes, flagged = route_files(pdf_paths, documents_index.classify)
+    kinds = dict(routes)
+
+    report = {
+        'testados': {os.path.basename(pdf_path): kind for pdf_path, kind in routes},
+        'dudosos': [{'filename': os.path.basename(pdf_path), 'kind': classification.kind,
+                     'confidence': classification.confidence} for pdf_path, classification in flagged],
+    }
+    return stream_processed([(pdf_path, get_processor_class(kind)) for pdf_path, kind in routes],
+                            lambda pdf_path: output_name(kinds[pdf_path], os.path.basename(pdf_path)),
+                            report)
+
+def process_all(processor_class):
+    files = get_document_index().filenames()
+    routes = [(os.path.join(UPLOAD_FOLDER, filename), processor_class) for filename in files]
+    return stream_processed(routes, lambda pdf_path: f'{os.path.splitext(os.path.basename(pdf_path))[0]}_testado.pdf')
+
+def stream_processed(routes, arcname, report=None):
+    """
+    Respuesta con el ZIP de los archivos testados; `report` (si hay) va al
+    principio como clasificacion.json. El perfil de guardado va en el
+    encabezado X-Save-Profile; el total de bytes se registra al terminar.
+    Si la petición trae `progress_id`, el avance (por archivo y por página)
+    se publica en /progress/<id>.
+    """
+    documents_index = get_document_index()
     zip_filename = 'procesados.zip'
+    workers = current_app.config.get('BATCH_WORKERS')
+    cache = get_result_cache()
+    profile = save_profile('BATCH_SAVE_PROFILE')
+    options = processor_options(profile)
+
+    batch_id = request.values.get('progress_id')
+    progress = get_batch_progress() if valid_batch_id(batch_id) else None
+    pages = {}
+    page_progress = None
+    if progress is not None:
+        for pdf_path, _ in routes:
+            document = documents_index.get(os.path.basename(pdf_path))
+            pages[pdf_path] = (document or {}).get('pages') or 0
+        progress.start(batch_id, len(routes), sum(pages.values()))
+        page_progress = PageProgress(progress, batch_id)
+
+    def file_done(pdf_path, error):
+        if progress is not None:
+            progress.file_done(batch_id, os.path.basename(pdf_path), pages[pdf_path], error)
+
+    def generate():
+        output_dir = tempfile.mkdtemp(prefix='procesados_')
+        summary = {'files': 0, 'bytes': 0}
+        finished = False
+        try:
+            entries = zip_entries(routes, arcname, output_dir, workers, cache, documents_index, options, summary,
+                                  file_done, page_progress)
+            if report is not None:
+                report_path = os.path.join(output_dir, 'clasificacion.json')
+                with open(report_path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+                entries = itertools.chain([('clasificacion.json', report_path)], entries)
+            yield from stream_zip(entries)
+            finished = True
+            print(f"Lote testado con el perfil {profile}: {summary['files']} archivos, {summary['bytes']} bytes")
+        finally:
+            # También si el cliente abandona la descarga, para que el navegador deje de consultar el avance
+            if progress is not None:
+                progress.finish(batch_id, BATCH_DONE if finished else BATCH_FAILED)
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    # El ZIP se envía por partes conforme terminan los archivos
+    return Response(generate(), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={zip_filename}', 'X-Save-Profile': profile})
+
+def zip_entries(routes, arcname, output_dir, workers, cache=None, documents_index=None, options=None, summary=None,
+                file_done=None, page_progress=None):
+    """
+    Entradas (nombre_en_zip, ruta) para stream_zip; cada salida se borra en
+    cuanto entra al ZIP. Si se pasa `summary` se le suman archivos y bytes;
+    `file_done(pdf_path, error)` se llama al terminar cada archivo y
+    `page_progress` (un PageProgress) recibe las páginas desde el pool.
+    """
+    processor_names = {pdf_path: processor_class.__name__ for pdf_path, processor_class in routes}
+    batch = process_routed(routes, output_dir, workers, cache=cache, options=options, page_progress=page_progress)
+    for pdf_path, output_path, error in batch:
+        filename = os.path.basename(pdf_path)
+        if documents_index is not None:
+            documents_index.record_result(filename, processor_names[pdf_path], error)
+        if file_done is not None:
+            file_done(pdf_path, error)
+        if error is not None:
+            print(f"Error al procesar el archivo {filename}: {error}")
+            continue
+
+        if summary is not None:
+            summary['files'] += 1
+            summary['bytes'] += os.path.getsize(output_path)
+        try:
+            yield arcname(pdf_path), output_path
+        finally:
+            os.remove(output_path)
+
+@pdf_bp.route('/progress/<batch_id>')
+def batch_progress(batch_id):
+    """
+    Avance de un lote de "Procesar Todos" en JSON: archivos y páginas
+    terminados, archivo en curso, ETA en segundos y errores por archivo. El
+    navegador lo consulta cada segundo; cada consulta libera el worker enseguida.
+    """
+    if not valid_batch_id(batch_id):
+        return jsonify(error='Identificador de lote inválido'), 400
+
+    state = get_batch_progress().get(batch_id)
+    if state is None:
+        return jsonify(error='Lote no encontrado'), 404
+    response = jsonify(state)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@pdf_bp.route('/classify/<filename>')
+def classify(filename):
+    """ Tipo detectado de un archivo subido, con su confianza y si hay que revisarlo a mano. """
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(file_path):
+        return jsonify(error=f'Archivo no encontrado: {filename}'), 404
+
+    classification = get_document_index().classify(file_path)
+    return jsonify(filename=filename, kind=classification.kind, confidence=classification.confidence,
+                   low_confidence=classification.low_confidence)
+
+
+@pdf_bp.route('/preview/<kind>/<filename>')
+def preview(kind, filename):
+    """
+    Vista previa del testado de un archivo: coincidencias por regla (página,
+    texto y rectángulos) y rectángulos que se testarían, sin testar ni guardar.
+    Con el tipo 'auto' se usa el tipo detectado del archivo.
+    """
+    if kind not in PROCESSORS and kind != AUTO:
+        return jsonify(error=f'Tipo de documento desconocido: {kind}'), 404
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(file_path):
+        return jsonify(error=f'Archivo no encontrado: {filename}'), 404
 
-    with zipfile.ZipFile(zip_output, 'w') as zip_file:
-        for filename in files:
-            try:
-                output = io.BytesIO()
-                processor = processor_class()  # Crea la instancia aquí
-                processor.ProcessPDF(os.path.join(UPLOAD_FOLDER, filename), output)
-
-                output.seek(0)
-                zip_file.writestr(f'{os.path.splitext(filename)[0]}_testado.pdf', output.read())
-            except Exception as e:
-                print(f"Error al procesar el archivo {filename}: {e}")
-
-    zip_output.seek(0)
-
-    return send_file(zip_output, as_attachment=True, download_name=zip_filename, mimetype='application/zip')
+    if kind == AUTO:
+        classification = get_document_index().classify(file_path)
+        if classification.kind is None:
+            return jsonify(error='No se pudo determinar el tipo de documento', filename=filename), 422
+        kind = classification.kind
 
+    try:
+        result = get_processor_class(kind)(**processor_options()).Preview(file_path)
+    except Exception as e:
+        return jsonify(error=str(e), filename=filename), 500
+    return jsonify(filename=filename, kind=kind, **result)
+
+@pdf_bp.route('/preview/<kind>')
+def preview_all(kind):
+    """
+    Vista previa de todos los PDF subidos, repartidos en el pool de procesos.
+    Con 'auto' los de tipo dudoso se listan en `flagged` sin revisar.
+    """
+    if kind not in PROCESSORS and kind != AUTO:
+        return jsonify(error=f'Tipo de documento desconocido: {kind}'), 404
+
+    started = time.perf_counter()
+    documents_index = get_document_index()
+    pdf_paths = [os.path.join(UPLOAD_FOLDER, filename) for filename in documents_index.filenames()]
+    flagged = []
+    if kind == AUTO:
+        routes, flagged = route_files(pdf_paths, documents_index.classify)
+    else:
+        routes = [(pdf_path, kind) for pdf_path in pdf_paths]
+    kinds = dict(routes)
+
+    files, errors = [], []
+    for pdf_path, result, error in preview_routed([(pdf_path, get_processor_class(kinds[pdf_path])) for pdf_path in kinds],
+                                                  current_app.config.get('BATCH_WORKERS'), processor_options()):
+        filename = os.path.basename(pdf_path)
+        if error is not None:
+            errors.append({'filename': filename, 'error': str(error)})
+        else:
+            files.append({'filename': filename, 'kind': kinds[pdf_path], **result})
+    files.sort(key=lambda preview: preview['filename'])
+
+    return jsonify(files=files, errors=errors,
+                   flagged=[{'filename': os.path.basename(pdf_path), 'kind': classification.kind,
+                             'confidence': classification.confidence} for pdf_path, classification in flagged],
+                   seconds=round(time.perf_counter() - started, 3))
 
 @pdf_bp.route('/delete_all', methods=['POST'])
 def delete_all():
-    files = [f for f in os.listdir(UPLOAD_FOLDER) if f.endswith('.pdf')]
-    for filename in files:
-        os.remove(os.path.join(UPLOAD_FOLDER, filename))
-        current_route = request.form.get('current_route', 'pdf.index')  
+    documents_index = get_document_index()
+    for filename in documents_index.filenames():
+        try:
+            os.remove(os.path.join(UPLOAD_FOLDER, filename))
+        except FileNotFoundError:
+            pass
+        documents_index.remove(filename)
+    current_route = request.form.get('current_route', 'pdf.index')
     return redirect(url_for(current_route))
 
+_result_cache = None
+
+def get_result_cache():
+    """ Caché de resultados compartida por las rutas; None si RESULT_CACHE_MAX_BYTES es 0. """
+    global _result_cache
+    max_bytes = current_app.config.get('RESULT_CACHE_MAX_BYTES', 1024 ** 3)
+    if not max_bytes:
+        return None
+    if _result_cache is None:
+        _result_cache = ResultCache(current_app.config.get('RESULT_CACHE_FOLDER', CACHE_FOLDER), max_bytes)
+    return _result_cache
+
+def processor_options(save_profile=None):
+    """ Opciones con que se crean los procesadores, según la configuración. """
+    return {'delete_qr': current_app.config.get('DELETE_QR', False),
+            'qr_detector': current_app.config.get('QR_DETECTOR'),
+            'save_profile': save_profile}
+
+def save_profile(config_key='SAVE_PROFILE'):
+    """ Perfil de guardado pedido (campo o parámetro `profile`), o el de la configuración si no hay uno válido. """
+    profile = request.values.get('profile')
+    if profile not in SAVE_PROFILES:
+        profile = current_app.config.get(config_key, DEFAULT_SAVE_PROFILE)
+    return profile
+
+def get_page_parallel():
+    """ Testado por rangos de páginas para archivos individuales grandes; None si PAGE_PARALLEL_MIN_PAGES es 0. """
+    min_pages = current_app.config.get('PAGE_PARALLEL_MIN_PAGES', 300)
+    if not min_pages:
+        return None
+    return PageParallel(min_pages, current_app.config.get('PAGE_PARALLEL_WORKERS'))
+
+_batch_progress = None
+
+def get_batch_progress():
+    """ Avance de los lotes, compartido entre procesos en la carpeta de trabajos. """
+    global _batch_progress
+    if _batch_progress is None:
+        _batch_progress = BatchProgress(os.path.join(current_app.config.get('JOBS_FOLDER', JOBS_FOLDER), 'progress.sqlite3'))
+    return _batch_progress
+
+_chunked_uploads = None
+
+def get_chunked_uploads():
+    """ Subidas por partes; su estado está en disco, así que una instancia por proceso basta. """
+    global _chunked_uploads
+    if _chunked_uploads is None:
+        _chunked_uploads = ChunkedUploads(UPLOAD_FOLDER, PARTIAL_UPLOAD_FOLDER,
+                                          max_bytes=current_app.config.get('UPLOAD_MAX_BYTES'),
+                                          index=get_document_index())
+    return _chunked_uploads
+
+_document_index = None
+
+def get_document_index():
+    """
+    Índice de los archivos subidos. Nunca se reconcilia con la carpeta dentro
+    de una petición: lo hace startup.warmup al arrancar y después el hilo de
+    `start_document_sync` en cada worker.
+    """
+    global _document_index
+    if _document_index is None:
+        _document_index = DocumentIndex(DOCUMENT_INDEX_PATH, UPLOAD_FOLDER)
+    return _document_index
+
+def start_document_sync():
+    """ Reconciliación en segundo plano del índice con la carpeta, cada DOCUMENT_SYNC_SECONDS. """
+    get_document_index().watch(current_app.config.get('DOCUMENT_SYNC_SECONDS', 60))
+
+@pdf_bp.route('/cache/stats')
+def cache_stats():
+    """ Aciertos y fallos de la caché de resultados en este proceso. """
+    cache = get_result_cache()
+    return jsonify(cache.stats() if cache else {'enabled': False})
+
+@pdf_bp.route('/metrics')
+def metrics():
+    """ Métricas de este proceso (y de sus procesos del pool) en formato de Prometheus. """
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@pdf_bp.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@pdf_bp.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    start = g.get('request_start')
+    if endpoint != 'pdf.metrics' and start is not None:
+        METRICS.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+        METRICS.observe('request_seconds', time.perf_counter() - start, endpoint=endpoint)
+    return response
+
+_job_queue = None
+
+def get_job_queue():
+    """ Cola de trabajos del proceso actual; se crea al primer uso (también después de un fork). """
+    global _job_queue
+    if _job_queue is None or _job_queue.pid != os.getpid():
+        config = current_app.config
+        _job_queue = JobQueue(config.get('JOBS_FOLDER', JOBS_FOLDER), UPLOAD_FOLDER,
+                              workers=config.get('JOB_WORKERS', 1),
+                              batch_workers=config.get('BATCH_WORKERS'),
+                              cache=get_result_cache(), index=get_document_index(),
+                              options=processor_options(),
+                              poll_interval=config.get('JOB_POLL_SECONDS', 5))
+    return _job_queue
+
+@pdf_bp.route('/jobs/<kind>', methods=['POST'])
+def submit_job(kind):
+    """
+    Encola el testado de un archivo (campo `filename`) o, si no se indica, de
+    todos los PDF subidos. Con el tipo 'auto' cada archivo va al procesador de
+    su tipo detectado. `profile` elige el perfil de guardado del trabajo.
+    """
+    if kind not in PROCESSORS and kind != AUTO:
+        return jsonify(error=f'Tipo de documento desconocido: {kind}'), 404
+
+    filename = request.form.get('filename') or (request.get_json(silent=True) or {}).get('filename')
+    if filename:
+        if os.path.basename(filename) != filename or not os.path.isfile(os.path.join(UPLOAD_FOLDER, filename)):
+            return jsonify(error=f'Archivo no encontrado: {filename}'), 404
+        files = [filename]
+    else:
+        files = get_document_index().filenames()
+        if not files:
+            return jsonify(error='No hay archivos PDF para procesar'), 400
+
+    job_id = get_job_queue().submit(kind, files, save_profile('BATCH_SAVE_PROFILE'))
+    return jsonify(job_id=job_id,
+                   status_url=url_for('pdf.job_status', job_id=job_id),
+                   result_url=url_for('pdf.job_result', job_id=job_id)), 202
+
+@pdf_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """ Estado y avance de un trabajo: archivos y páginas procesadas, errores por archivo. """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error='Trabajo no encontrado'), 404
+
+    job.pop('result_path')
+    job['result_url'] = url_for('pdf.job_result', job_id=job_id) if job['status'] == DONE else None
+    return jsonify(job)
+
+@pdf_bp.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """ Descarga el PDF (o ZIP) generado por un trabajo terminado. """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error='Trabajo no encontrado'), 404
+    if job['status'] != DONE:
+        return jsonify(error='El trabajo aún no termina', status=job['status']), 409
+
+    return send_file(job['result_path'], as_attachment=True, download_name=job['result_name'])
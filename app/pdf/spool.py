@@ -0,0 +1,77 @@
+import io
+
+import tempfile
+
+from .metrics import METRICS
+
+# Salidas más chicas que esto se quedan en memoria
+DEFAULT_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+class SpooledOutput:
+    """
+    Salida de un testado: en memoria mientras pesa menos de `max_bytes` y en
+    un archivo temporal en disco a partir de ahí.
+
+    Se pasa como `output_path` a ProcessPDF/process_cached en lugar de un
+    BytesIO. El temporal se crea ya borrado (TemporaryFile), así que su espacio
+    se libera al cerrarlo aunque el proceso muera antes de limpiar. No tiene
+    atributo `name` a propósito: PyMuPDF trata como ruta cualquier objeto que
+    lo tenga (por eso no sirve tempfile.SpooledTemporaryFile).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SPOOL_BYTES, folder=None):
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self._file = io.BytesIO()
+        self.on_disk = False
+
+    def _rollover(self):
+        disk = tempfile.TemporaryFile(prefix='testado_', suffix='.pdf', dir=self.folder)
+        disk.write(self._file.getbuffer())
+        disk.seek(self._file.tell())
+        self._file.close()
+        self._file = disk
+        self.on_disk = True
+        METRICS.inc('spooled_outputs_total')
+
+    def write(self, data):
+        if not self.on_disk and self._file.tell() + len(data) > self.max_bytes:
+            self._rollover()
+        return self._file.write(data)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def truncate(self, size=None):
+        return self._file.truncate(size)
+
+    def flush(self):
+        self._file.flush()
+
+    def detach(self):
+        """
+        Entrega el archivo de abajo (BytesIO o temporal en disco) al principio,
+        para que lo cierre quien lo reciba; send_file lo cierra al terminar la
+        respuesta y, si es un archivo en disco, gunicorn lo manda con sendfile.
+        """
+        file, self._file = self._file, None
+        file.seek(0)
+        return file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
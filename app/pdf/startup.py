@@ -0,0 +1,115 @@
+"""
+Arranque de los procesos de gunicorn: precarga en el maestro y perfil de arranque.
+
+Con `preload_app` (ver gunicorn.conf.py) el maestro importa la app y llama a
+`warmup()` antes de crear los workers: MuPDF, reportlab, Pillow y las marcas
+de agua ya generadas quedan en la memoria del maestro y los workers las
+comparten copy-on-write en lugar de cargar cada uno su copia. También ahí se
+reconcilia el índice de archivos con la carpeta de cargas, para que ninguna
+petición pague ese recorrido.
+
+    python -m app.pdf.startup
+
+imprime el perfil de un arranque en frío (tiempo y RSS de cada paso). Se corre
+desde la raíz del repositorio, igual que gunicorn.
+"""
+
+import importlib
+
+import os
+
+import resource
+
+import sys
+
+import time
+
+from contextlib import contextmanager
+
+# Módulos pesados que conviene cargar una sola vez en el maestro
+HEAVY_MODULES = ('fitz', 'reportlab.pdfgen.canvas', 'PIL.Image')
+
+
+def rss_bytes():
+    """ Memoria residente actual del proceso (pico si no hay /proc). """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def step(steps, name):
+    """ Agrega a `steps` el tiempo y la RSS al terminar el bloque. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps.append((name, time.perf_counter() - start, rss_bytes()))
+
+
+def overlays():
+    """ Las marcas de agua que ponen los procesadores (constantes Overlay de sus módulos). """
+    from . import DeleteQR
+    from .processors import PROCESSORS
+    from .watermarks import Overlay
+
+    modules = [sys.modules[processor_class.__module__] for processor_class, _ in PROCESSORS.values()] + [DeleteQR]
+    found = {}
+    for module in modules:
+        for value in vars(module).values():
+            if isinstance(value, Overlay):
+                found[value] = None
+    return list(found)
+
+
+def warmup():
+    """ Carga los módulos pesados, genera las marcas y sincroniza el índice; regresa los pasos (nombre, segundos, rss). """
+    steps = []
+    for name in HEAVY_MODULES:
+        with step(steps, f'import {name}'):
+            importlib.import_module(name)
+
+    from .metrics import METRICS
+    from .watermarks import render_overlay
+
+    with step(steps, 'marcas de agua'):
+        for overlay in overlays():
+            render_overlay(overlay)
+
+    from .routes import get_document_index
+
+    with step(steps, 'índice de archivos'):
+        added, removed = get_document_index().sync()
+    if added or removed:
+        print(f"Índice de archivos: {added} agregados, {removed} quitados")
+
+    # Lo medido aquí no es trabajo de ningún worker
+    METRICS.drain()
+    return steps
+
+
+def report(steps, title='Perfil de arranque'):
+    lines = [f'{title} (pid {os.getpid()}):']
+    for name, seconds, rss in steps:
+        lines.append(f'  {name:<32} {seconds * 1000:8.1f} ms   RSS {rss / 1024 ** 2:7.1f} MB')
+    lines.append(f'  {"total":<32} {sum(seconds for _, seconds, _ in steps) * 1000:8.1f} ms')
+    return '\n'.join(lines)
+
+
+def main():
+    # `python -m` ya importó el paquete app, y con él Flask
+    steps = [('intérprete y flask', 0.0, rss_bytes())]
+    steps += warmup()
+
+    with step(steps, 'create_app'):
+        from app import create_app
+        create_app(os.path.join(os.getcwd(), 'instance', os.getenv('APP_SETTINGS_MODULE', 'config.py')))
+
+    print(report(steps))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
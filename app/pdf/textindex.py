@@ -0,0 +1,68 @@
+from array import array
+
+import fitz
+
+
+class PageTextIndex:
+    """
+    Texto de una página junto con la caja de cada carácter.
+
+    Se arma con una sola extracción "rawdict" y su texto es el mismo que da
+    page.get_text("text"), así que un span de una coincidencia de regex sobre
+    `text` se traduce directo a rectángulos sin volver a buscar en la página.
+    Las cajas se guardan en arreglos planos para que mantener el índice de
+    muchas páginas en memoria salga barato.
+    """
+
+    def __init__(self, page):
+        chars = []
+        boxes = array('f')
+        lines = array('i')
+
+        raw = page.get_text("rawdict", flags=fitz.TEXTFLAGS_TEXT)
+        line_no = 0
+        for block in raw['blocks']:
+            if block['type'] != 0:
+                continue
+            for line in block['lines']:
+                for span in line['spans']:
+                    for char in span['chars']:
+                        chars.append(char['c'])
+                        boxes.extend(char['bbox'])
+                        lines.append(line_no)
+
+                # Salto de línea igual que en la salida de texto de MuPDF; no tiene caja
+                chars.append('\n')
+                boxes.extend((0, 0, 0, 0))
+                lines.append(-1)
+                line_no += 1
+
+        self.text = ''.join(chars)
+        self._boxes = boxes
+        self._lines = lines
+
+    def rects(self, start, end):
+        """ Rectángulos (uno por renglón) que cubren text[start:end], sin espacios en los extremos. """
+        while start < end and self.text[start].isspace():
+            start += 1
+        while end > start and self.text[end - 1].isspace():
+            end -= 1
+
+        rects = []
+        current_line = None
+        for i in range(start, end):
+            line_no = self._lines[i]
+            if line_no < 0:
+                continue
+
+            box = fitz.Rect(*self._boxes[4 * i:4 * i + 4])
+            if line_no != current_line:
+                current_line = line_no
+                rects.append(box)
+            else:
+                rects[-1] |= box
+
+        return rects
+
+    def match_rects(self, match, group=0):
+        return self.rects(*match.span(group))
@@ -0,0 +1,271 @@
+import fcntl
+
+import hashlib
+
+import json
+
+import os
+
+import tempfile
+
+import threading
+
+import time
+
+import uuid
+
+import fitz
+
+from .classify import detect_kind
+
+# Bloques en los que se lee el cuerpo de la petición y se escribe a disco
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """ Error de una carga que se le reporta al cliente; `status` es el código HTTP. """
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def copy_stream(stream, f, digest=None, limit=None):
+    """ Copia `stream` a `f` por bloques actualizando el hash (si hay); regresa los bytes escritos. """
+    written = 0
+    while True:
+        size = CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - written)
+        if size <= 0:
+            break
+        block = stream.read(size)
+        if not block:
+            break
+        f.write(block)
+        if digest is not None:
+            digest.update(block)
+        written += len(block)
+    return written
+
+
+def inspect_pdf(path):
+    """
+    Páginas y tipo detectado (Classification) del PDF, abriéndolo una sola vez.
+    MuPDF solo lee la tabla xref y el texto de las primeras páginas, no el documento completo.
+    """
+    try:
+        doc = fitz.open(path, filetype='pdf')
+    except Exception:
+        raise UploadError('El archivo no es un PDF válido')
+    with doc:
+        return len(doc), detect_kind(doc)
+
+
+def clean_filename(filename):
+    filename = os.path.basename((filename or '').replace('\\', '/'))
+    if not filename.lower().endswith('.pdf') or filename.startswith('.'):
+        raise UploadError('Solo se aceptan archivos PDF')
+    return filename
+
+
+class ChunkedUploads:
+    """
+    Cargas reanudables, escritas a disco por bloques conforme llegan.
+
+    Una carga se crea con el nombre y el tamaño total; después el cliente manda
+    partes en orden indicando el offset donde empiezan. El estado vive en disco
+    (`<id>.json` y `<id>.part` en `partial_folder`), así que cualquier proceso
+    de gunicorn puede recibir la siguiente parte y una conexión caída se
+    reanuda desde el offset que ya quedó escrito. El SHA-256 se calcula al
+    escribir; si una parte llega a un proceso que no tiene el hash en memoria,
+    lo reconstruye leyendo lo que ya estaba en disco.
+    """
+
+    def __init__(self, upload_folder, partial_folder, retention=24 * 3600, max_bytes=None, index=None):
+        self.upload_folder = upload_folder
+        self.partial_folder = partial_folder
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.index = index
+        self._digests = {}
+        self._lock = threading.Lock()
+        os.makedirs(partial_folder, exist_ok=True)
+
+    def _paths(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError('Carga no encontrada', 404)
+        base = os.path.join(self.partial_folder, upload_id)
+        return f'{base}.json', f'{base}.part'
+
+    def _load(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError('Carga no encontrada', 404)
+
+    def create(self, filename, size):
+        filename = clean_filename(filename)
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError('Falta el tamaño del archivo')
+        if size <= 0:
+            raise UploadError('El archivo está vacío')
+        if self.max_bytes and size > self.max_bytes:
+            raise UploadError('El archivo es demasiado grande', 413)
+
+        self.purge()
+
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'filename': filename, 'size': size, 'created_at': time.time()}, f)
+
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        meta = self._load(upload_id)
+        _, part_path = self._paths(upload_id)
+        return _state(upload_id, meta, os.path.getsize(part_path))
+
+    def append(self, upload_id, offset, stream):
+        """
+        Escribe una parte que empieza en `offset`. Regresa el estado nuevo; al
+        completar el tamaño total mueve el archivo a la carpeta de cargas y
+        agrega sha256 y pages.
+        """
+        meta = self._load(upload_id)
+        _, part_path = self._paths(upload_id)
+
+        with open(part_path, 'r+b') as f:
+            # Dos partes de la misma carga no se escriben a la vez, aunque lleguen a procesos distintos
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadError('El offset no coincide con lo recibido', 409, offset=current)
+
+            digest = self._digest(upload_id, f, current)
+            f.seek(current)
+            try:
+                copy_stream(stream, f, digest, meta['size'] - current)
+            finally:
+                f.flush()
+                with self._lock:
+                    self._digests[upload_id] = (f.tell(), digest)
+
+            if f.tell() < meta['size']:
+                return _state(upload_id, meta, f.tell())
+
+            return self._complete(upload_id, meta, digest)
+
+    def _digest(self, upload_id, f, offset):
+        with self._lock:
+            cached = self._digests.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1].copy()
+
+        digest = hashlib.sha256()
+        f.seek(0)
+        copy_stream(f, _NullWriter(), digest, offset)
+        return digest
+
+    def _complete(self, upload_id, meta, digest):
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            info = self.publish(part_path, meta['filename'], digest, meta['size'])
+        finally:
+            self.cancel(upload_id)
+        return dict(_state(upload_id, meta, meta['size']), sha256=info['sha256'], pages=info['pages'],
+                    kind=info['kind'], kind_low_confidence=info['kind_low_confidence'])
+
+    def cancel(self, upload_id):
+        with self._lock:
+            self._digests.pop(upload_id, None)
+        for path in self._paths(upload_id):
+            _remove(path)
+
+    def new_part(self):
+        """ Archivo temporal para una carga, en el mismo sistema de archivos que la carpeta de cargas. """
+        fd, part_path = tempfile.mkstemp(suffix='.tmp', dir=self.partial_folder)
+        return os.fdopen(fd, 'wb'), part_path
+
+    def publish(self, part_path, filename, digest, size):
+        """
+        Valida un archivo ya escrito (tamaño y que sea un PDF), detecta su tipo,
+        lo mueve a la carpeta de cargas con su nombre y lo registra en el índice
+        si hay uno. Si no es válido lo borra y levanta UploadError; un tipo
+        dudoso no lo invalida.
+        """
+        try:
+            if self.max_bytes and size > self.max_bytes:
+                raise UploadError('El archivo es demasiado grande', 413)
+            if not size:
+                raise UploadError('El archivo está vacío')
+
+            pages, (kind, confidence, _, low_confidence) = inspect_pdf(part_path)
+            os.replace(part_path, os.path.join(self.upload_folder, filename))
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        info = {'filename': filename, 'size': size, 'sha256': digest.hexdigest(), 'pages': pages,
+                'kind': kind, 'kind_confidence': confidence, 'kind_low_confidence': low_confidence}
+        if self.index is not None:
+            self.index.add(**info)
+        return info
+
+    def save_stream(self, filename, stream):
+        """ Carga completa en una sola petición: escribe por bloques, calcula hash y páginas y la publica. """
+        filename = clean_filename(filename)
+        digest = hashlib.sha256()
+
+        f, part_path = self.new_part()
+        try:
+            with f:
+                size = copy_stream(stream, f, digest, self.max_bytes + 1 if self.max_bytes else None)
+        except Exception:
+            os.remove(part_path)
+            raise
+
+        return dict(self.publish(part_path, filename, digest, size), complete=True)
+
+    def purge(self):
+        """ Borra las cargas que llevan más de `retention` segundos sin recibir partes. """
+        limit = time.time() - self.retention
+        for entry in os.scandir(self.partial_folder):
+            upload_id, extension = os.path.splitext(entry.name)
+            if extension == '.tmp':
+                # Restos de una carga en una sola petición que se interrumpió
+                if entry.stat().st_mtime < limit:
+                    _remove(entry.path)
+                continue
+            if extension != '.json':
+                continue
+
+            _, part_path = self._paths(upload_id)
+            try:
+                last_write = os.path.getmtime(part_path)
+            except FileNotFoundError:
+                last_write = entry.stat().st_mtime
+            if last_write < limit:
+                self.cancel(upload_id)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _state(upload_id, meta, offset):
+    return {'upload_id': upload_id, 'filename': meta['filename'], 'size': meta['size'],
+            'offset': offset, 'complete': offset >= meta['size']}
+
+
+class _NullWriter:
+    def write(self, block):
+        pass
@@ -0,0 +1,115 @@
+import io
+
+import threading
+
+from collections import namedtuple
+
+from functools import lru_cache
+
+import fitz
+
+from .metrics import METRICS
+
+# Rectángulo negro (x, y, ancho, alto en puntos de reportlab) con líneas de texto rojo encima
+Overlay = namedtuple('Overlay', ['rect', 'lines'])
+
+# Leyendas que comparten varios procesadores
+LEYENDA_PERSONA_FISICA = (
+    "Nombre, domicilio, teléfono y correo electrónico de Persona Física, art.",
+    "113, fracción I de la LFTAIP y art. 116, primer párrafo de la LGTAIP.",
+)
+LEYENDA_REPRESENTANTE_LEGAL = (
+    "Domicilio, teléfono y correo electrónico del Representante Legal, art. 113,",
+    "fracción I de la LFTAIP y art. 116, primer párrafo de la LGTAIP.",
+)
+LEYENDA_LATERAL_PERSONA_FISICA = (
+    "Nombre de",
+    "Persona",
+    "Física",
+    "art. 113,",
+    "fracción",
+    "I de la",
+    "LFTAIP ",
+    "y art 16,",
+    "primer",
+    "párrafo de",
+    "la LGTAIP.",
+)
+
+
+@lru_cache(maxsize=64)
+def render_overlay(overlay):
+    """ PDF de una página con la marca; se genera con reportlab una sola vez por proceso. """
+    with METRICS.stage('watermark_render'):
+        return _render(overlay)
+
+
+def _render(overlay):
+    # reportlab solo hace falta para generar las marcas, y cada una se genera una vez por proceso
+    # (o una sola vez en el maestro de gunicorn, ver startup.py)
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.colors import black, red
+
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=letter)
+
+    rect_x, rect_y, rect_width, rect_height = overlay.rect
+
+    can.setFillColor(black)
+    can.rect(rect_x, rect_y, rect_width, rect_height, fill=True, stroke=False)
+
+    text_object = can.beginText()
+    text_object.setTextOrigin(rect_x + 5, rect_y + rect_height - 15)
+    text_object.setFont("Helvetica", 9)
+    line_height = 2
+    can.setFillColor(red)
+
+    for line in overlay.lines:
+        text_object.textLine(line)
+        text_object.moveCursor(0, -line_height)
+
+    can.drawText(text_object)
+    can.save()
+    return packet.getvalue()
+
+
+# Los documentos de MuPDF no se comparten entre hilos: cada hilo abre su copia en memoria
+_local = threading.local()
+
+
+def get_overlay_document(overlay):
+    documents = _local.__dict__.setdefault('documents', {})
+    document = documents.get(overlay)
+    if document is None:
+        document = fitz.open("pdf", render_overlay(overlay))
+        documents[overlay] = document
+    return document
+
+
+def stamp(page, overlay):
+    """ Pone la marca sobre toda la página, igual que show_pdf_page con el PDF de reportlab. """
+    page.show_pdf_page(page.rect, get_overlay_document(overlay), 0)
+
+
+class StampPlan:
+    """
+    Marcas pendientes por página.
+
+    Cada marca se pone a lo más una vez por página y todas se aplican al final,
+    después de las redacciones; como el documento de cada marca es el mismo
+    objeto, MuPDF reutiliza un solo Form XObject por marca en todo el PDF.
+    """
+
+    def __init__(self):
+        self._pages = {}
+
+    def add(self, page_num, overlay):
+        self._pages.setdefault(page_num, {})[overlay] = None
+
+    def apply(self, doc):
+        for page_num in sorted(self._pages):
+            page = doc[page_num]
+            for overlay in self._pages[page_num]:
+                stamp(page, overlay)
+        self._pages.clear()
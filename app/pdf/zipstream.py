@@ -0,0 +1,61 @@
+import io
+
+import os
+
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    """ Destino no "seekable" para ZipFile: acumula lo escrito hasta que se drena. """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    """
+    Genera un ZIP por partes a partir de tuplas (nombre_en_zip, ruta_en_disco).
+
+    Cada archivo se copia en bloques de CHUNK_SIZE, así que en memoria solo vive
+    un bloque a la vez y los primeros bytes salen en cuanto llega la primera entrada.
+    """
+    sink = _ChunkSink()
+
+    with zipfile.ZipFile(sink, 'w') as zip_file:
+        for arcname, path in entries:
+            force_zip64 = os.path.getsize(path) >= zipfile.ZIP64_LIMIT
+
+            with open(path, 'rb') as src, zip_file.open(arcname, 'w', force_zip64=force_zip64) as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Directorio central del ZIP
+    data = sink.drain()
+    if data:
+        yield data
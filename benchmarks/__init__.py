@@ -0,0 +1,10 @@
+"""
+Benchmarks del testado.
+
+    python -m benchmarks.corpus bench/corpus --pages 1 10 100 500
+    python -m benchmarks.run bench/corpus --output bench/resultados.json
+    python -m benchmarks.run bench/corpus --output bench/nuevo.json --baseline bench/resultados.json
+    python -m benchmarks.parallel_check bench/corpus --min-pages 100 --workers 4
+
+Se corren desde la raíz del repositorio para que `app` se pueda importar.
+"""
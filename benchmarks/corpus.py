@@ -0,0 +1,225 @@
+"""
+Generador de un corpus sintético de resoluciones para los benchmarks.
+
+Por cada tipo de documento (residuos, impacto, atmosfera) y variante (persona
+física o moral) genera PDFs de varias longitudes con reportlab. La primera
+página trae el bloque de datos del solicitante donde lo buscan los
+procesadores; el resto es texto de relleno con RFC, CURP, teléfonos, correos
+y domicilios repartidos al azar. Con la misma semilla el corpus es idéntico.
+"""
+
+import argparse
+
+import json
+
+import os
+
+import random
+
+import textwrap
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+KINDS = ('residuos', 'impacto', 'atmosfera')
+VARIANTS = ('individual', 'corporate')
+PAGE_COUNTS = (1, 10, 50, 100, 500)
+
+LINE_HEIGHT = 12
+LINES_PER_PAGE = 56
+WRAP_WIDTH = 100
+
+# Probabilidad de que el siguiente párrafo de relleno sea un dato personal
+PII_RATE = 0.15
+
+NOMBRES = ['Juan', 'María', 'José', 'Ana', 'Luis', 'Carmen', 'Jorge', 'Laura', 'Pedro', 'Rosa', 'Miguel', 'Elena']
+APELLIDOS = ['Pérez', 'López', 'García', 'Hernández', 'Martínez', 'Gómez', 'Ruiz', 'Torres', 'Díaz', 'Flores', 'Sánchez', 'Ramírez']
+EMPRESAS = ['RECICLADORA DEL NORTE', 'SERVICIOS AMBIENTALES DEL BAJÍO', 'QUÍMICA INDUSTRIAL DEL GOLFO', 'TRANSPORTES ECOLÓGICOS DEL CENTRO']
+CALLES = ['Calle Hidalgo', 'Avenida Juárez', 'Calle Morelos', 'Boulevard Insurgentes', 'Calle Reforma']
+COLONIAS = ['Col. Centro', 'Col. Industrial', 'Col. del Valle', 'Col. San Rafael']
+MUNICIPIOS = ['Municipio de Apodaca', 'Alcaldía Coyoacán', 'Municipio de León', 'Municipio de Tlalnepantla']
+ESTADOS = ['Estado de Nuevo León', 'Ciudad de México', 'Estado de Guanajuato', 'Estado de México']
+
+FILLER = [
+    "Que con fundamento en los artículos 32 Bis de la Ley Orgánica de la Administración Pública Federal y 5o. de la "
+    "Ley General para la Prevención y Gestión Integral de los Residuos, esta autoridad es competente para resolver.",
+    "Que la información presentada por el promovente cumple con los requisitos establecidos en el Reglamento de la "
+    "Ley General del Equilibrio Ecológico y la Protección al Ambiente en materia de evaluación del impacto ambiental.",
+    "Que el proyecto consiste en la operación de una instalación para el acopio y almacenamiento temporal de residuos "
+    "peligrosos, con una capacidad máxima de 120 toneladas anuales y un área de almacén de 250 metros cuadrados.",
+    "Que las emisiones a la atmósfera provenientes de fuentes fijas deberán cumplir con los niveles máximos "
+    "permisibles establecidos en las Normas Oficiales Mexicanas aplicables y en la presente resolución.",
+    "Que el interesado deberá presentar ante esta Secretaría un informe anual de cumplimiento de las condicionantes "
+    "dentro de los primeros tres meses de cada año calendario durante la vigencia de la autorización.",
+    "Que la presente autorización se otorga sin perjuicio de las demás autorizaciones, permisos o licencias que "
+    "correspondan a otras autoridades federales, estatales o municipales.",
+    "Que el incumplimiento de cualquiera de los términos de la presente resolución será motivo de revocación, "
+    "independientemente de las sanciones administrativas, civiles o penales que procedan.",
+]
+
+TITLE = [
+    "SECRETARÍA DE MEDIO AMBIENTE Y RECURSOS NATURALES",
+    "SUBSECRETARÍA DE GESTIÓN PARA LA PROTECCIÓN AMBIENTAL",
+    "DIRECCIÓN GENERAL DE GESTIÓN INTEGRAL DE MATERIALES Y ACTIVIDADES RIESGOSAS",
+    "",
+    "Oficio No. DGGIMAR.710/0001/2024",
+    "Ciudad de México, a 15 de enero de 2024",
+    "",
+    "RESOLUCIÓN",
+    "",
+    "Asunto: Se resuelve la solicitud presentada",
+    "",
+]
+
+
+def nombre(rng):
+    return f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}'
+
+
+def empresa(rng):
+    return f'{rng.choice(EMPRESAS)} S.A. DE C.V.'
+
+
+def domicilio(rng):
+    return (f'{rng.choice(CALLES)} {rng.randint(1, 999)}, {rng.choice(COLONIAS)}, {rng.choice(MUNICIPIOS)}, '
+            f'{rng.choice(ESTADOS)} C.P. {rng.randint(10000, 99999)}.')
+
+
+def letras(rng, count):
+    return ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(count))
+
+
+def fecha(rng):
+    return f'{rng.randint(50, 99):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}'
+
+
+def rfc(rng, moral=False):
+    return f'{letras(rng, 3 if moral else 4)}{fecha(rng)}{letras(rng, 2)}{rng.randint(0, 9)}'
+
+
+def curp(rng):
+    return f'{letras(rng, 4)}{fecha(rng)}{rng.choice("HM")}{rng.randint(10, 99)}{letras(rng, 3)}{rng.randint(0, 9)}'
+
+
+def telefono(rng):
+    return f'{rng.randint(33, 99)} {rng.randint(1000, 9999)} {rng.randint(1000, 9999)}'
+
+
+def correo(rng):
+    return f'{rng.choice(NOMBRES).lower().replace("í", "i").replace("é", "e").replace("á", "a")}{rng.randint(1, 99)}@ejemplo.com.mx'
+
+
+def applicant_block(kind, variant, rng):
+    """ Renglones con los datos del solicitante, tal como los buscan los procesadores en la primera página. """
+    individual = variant == 'individual'
+
+    if kind == 'residuos':
+        if individual:
+            lines = [f'C. {nombre(rng)}  Persona física con actividad empresarial {domicilio(rng)}']
+        else:
+            lines = [f'{empresa(rng)} {domicilio(rng)}']
+        lines += [f'RFC: {rfc(rng, moral=not individual)}', f'Teléfono: {telefono(rng)}',
+                  f'Correo electrónico: {correo(rng)}']
+    elif kind == 'impacto':
+        if individual:
+            lines = [f'C. {nombre(rng)}, en representacion de {empresa(rng)}']
+        else:
+            lines = [f'{empresa(rng)}, por conducto de su apoderado legal']
+        lines += [f'Registro Federal de Contribuyentes {rfc(rng, moral=not individual)}',
+                  f'Instituto Nacional Electoral con clave {rng.randint(10 ** 12, 10 ** 13 - 1)}',
+                  f'C. {nombre(rng)} acredita su personalidad con el instrumento notarial correspondiente.']
+    else:
+        if individual:
+            lines = ['Persona física',
+                     f'Solicitud por medio de la cual la C. {nombre(rng)} solicita la licencia de funcionamiento',
+                     f'y acredita la personalidad jurídica de la C. {nombre(rng)}',
+                     domicilio(rng)]
+        else:
+            lines = [f'{empresa(rng)} solicita la licencia de funcionamiento', domicilio(rng)]
+
+    return [wrapped for line in lines for wrapped in textwrap.wrap(line, WRAP_WIDTH)]
+
+
+def pii_lines(kind, variant, rng):
+    """ Un dato personal suelto para el texto de relleno. """
+    if kind == 'impacto':
+        options = [f'Registro Federal de Contribuyentes {rfc(rng)}',
+                   f'Instituto Nacional Electoral con clave {rng.randint(10 ** 12, 10 ** 13 - 1)}',
+                   f'C. {nombre(rng)} acredita su personalidad']
+    elif kind == 'atmosfera':
+        options = [f'por medio de la cual la C. {nombre(rng)} manifiesta lo conducente',
+                   f'personalidad jurídica de la C. {nombre(rng)}']
+    else:
+        options = [f'RFC: {rfc(rng)}', f'CURP: {curp(rng)}', f'Teléfono: {telefono(rng)}',
+                   f'Correo electrónico: {correo(rng)}', f'CORREO: {correo(rng)}',
+                   f'{empresa(rng)} {domicilio(rng)}']
+        if variant == 'individual':
+            options.append(f'C. {nombre(rng)} Ubicación de la instalación: {domicilio(rng)}')
+
+    return textwrap.wrap(rng.choice(options), WRAP_WIDTH)
+
+
+def page_lines(kind, variant, page_num, rng):
+    lines = (list(TITLE) + applicant_block(kind, variant, rng) + ['']) if page_num == 0 else []
+    while len(lines) < LINES_PER_PAGE:
+        if rng.random() < PII_RATE:
+            lines += pii_lines(kind, variant, rng)
+        else:
+            lines += textwrap.wrap(rng.choice(FILLER), WRAP_WIDTH)
+    return lines[:LINES_PER_PAGE]
+
+
+def build_document(path, kind, variant, pages, rng):
+    can = canvas.Canvas(path, pagesize=letter)
+    _, height = letter
+
+    for page_num in range(pages):
+        can.setFont("Helvetica", 9)
+        y = height - 52
+        for line in page_lines(kind, variant, page_num, rng):
+            can.drawString(60, y, line)
+            y -= LINE_HEIGHT
+        can.showPage()
+
+    can.save()
+
+
+def generate_corpus(output_dir, page_counts=PAGE_COUNTS, kinds=KINDS, variants=VARIANTS, seed=0):
+    """
+    Genera el corpus en `output_dir` junto con un manifest.json que describe cada archivo.
+
+    Regresa la lista del manifiesto: dicts con file, kind, variant y pages.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+
+    for kind in kinds:
+        for variant in variants:
+            for pages in page_counts:
+                filename = f'{kind}_{variant}_{pages:03d}.pdf'
+                # Una semilla por archivo: agregar tamaños no cambia los archivos que ya existían
+                rng = random.Random(f'{seed}-{filename}')
+                build_document(os.path.join(output_dir, filename), kind, variant, pages, rng)
+                manifest.append({'file': filename, 'kind': kind, 'variant': variant, 'pages': pages})
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'documents': manifest}, f, indent=2, ensure_ascii=False)
+
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera un corpus sintético de resoluciones en PDF.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--pages', type=int, nargs='+', default=PAGE_COUNTS, help='número de páginas de cada documento')
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=VARIANTS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    manifest = generate_corpus(args.output_dir, args.pages, args.kinds, args.variants, args.seed)
+    print(f"{len(manifest)} documentos, {sum(doc['pages'] for doc in manifest)} páginas en {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
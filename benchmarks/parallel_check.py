@@ -0,0 +1,115 @@
+"""
+Compara el testado por rangos de páginas (parallel.process_document) con el
+testado en serie (ProcessPDF) sobre el corpus sintético.
+
+Por documento revisa que las dos salidas tengan el mismo número de páginas,
+el mismo texto y el mismo render de cada página, y la misma estructura a
+nivel documento (índice, ligas, campos de formulario y llaves del catálogo
+que insert_pdf no copia). Termina con código 1 si alguna salida difiere.
+
+    python -m benchmarks.parallel_check bench/corpus --min-pages 100 --workers 4
+"""
+
+import argparse
+
+import hashlib
+
+import os
+
+import sys
+
+import tempfile
+
+import time
+
+import fitz
+
+from app.pdf.parallel import STRUCTURE_KEYS, PageParallel, process_document
+from app.pdf.processors import PROCESSORS, get_processor_class
+
+from .run import load_manifest
+
+# Resolución del render que se compara; basta para notar un testado de más o de menos
+RENDER_DPI = 40
+
+
+def fingerprint(pdf_path):
+    """ Lo que debe coincidir entre las dos salidas: páginas (texto y render) y estructura del documento. """
+    with fitz.open(pdf_path) as doc:
+        catalog = doc.pdf_catalog()
+        pages = []
+        links = []
+        for page in doc:
+            pixmap = page.get_pixmap(dpi=RENDER_DPI)
+            pages.append((page.get_text('text'), hashlib.sha256(pixmap.samples).hexdigest()))
+            links.append([(link['kind'], link.get('page'), link.get('uri')) for link in page.get_links()])
+        return {
+            'pages': pages,
+            'toc': doc.get_toc(simple=True),
+            'links': links,
+            'fields': sorted((widget.field_name, widget.field_value) for page in doc for widget in page.widgets()),
+            'catalog': {key: doc.xref_get_key(catalog, key)[0] for key in STRUCTURE_KEYS},
+        }
+
+
+def differences(serial, parallel):
+    """ Descripción de cada diferencia entre dos huellas; vacía si son iguales. """
+    if len(serial['pages']) != len(parallel['pages']):
+        return [f"páginas: {len(serial['pages'])} en serie, {len(parallel['pages'])} por rangos"]
+    found = []
+    for page_num, (before, after) in enumerate(zip(serial['pages'], parallel['pages'])):
+        if before[0] != after[0]:
+            found.append(f'texto de la página {page_num + 1}')
+        if before[1] != after[1]:
+            found.append(f'render de la página {page_num + 1}')
+    for key in ('toc', 'links', 'fields', 'catalog'):
+        if serial[key] != parallel[key]:
+            found.append(key)
+    return found
+
+
+def check(corpus_dir, kinds=None, min_pages=100, workers=None):
+    """ Procesa cada documento de al menos `min_pages` páginas de las dos formas; regresa cuántos difieren. """
+    documents = [doc for doc in load_manifest(corpus_dir)
+                 if doc['pages'] >= min_pages and (not kinds or doc['kind'] in kinds)]
+    page_parallel = PageParallel(min_pages, workers)
+    failed = 0
+
+    with tempfile.TemporaryDirectory(prefix='comparacion_') as output_dir:
+        serial_path = os.path.join(output_dir, 'serie.pdf')
+        parallel_path = os.path.join(output_dir, 'rangos.pdf')
+
+        for doc in documents:
+            pdf_path = os.path.join(corpus_dir, doc['file'])
+            processor = get_processor_class(doc['kind'])()
+
+            start = time.perf_counter()
+            processor.ProcessPDF(pdf_path, serial_path)
+            serial_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            process_document(processor, pdf_path, parallel_path, page_parallel)
+            parallel_seconds = time.perf_counter() - start
+
+            found = differences(fingerprint(serial_path), fingerprint(parallel_path))
+            failed += bool(found)
+            status = 'igual' if not found else 'DIFIERE: ' + ', '.join(found[:5])
+            print(f"{doc['file']:<40} {doc['pages']:>5} págs  {serial_seconds:>7.2f} s → {parallel_seconds:>7.2f} s  {status}")
+
+    print(f'{len(documents) - failed} de {len(documents)} documentos iguales')
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara el testado por rangos de páginas con el testado en serie.')
+    parser.add_argument('corpus_dir')
+    parser.add_argument('--kinds', nargs='+', choices=list(PROCESSORS))
+    parser.add_argument('--min-pages', type=int, default=100, help='páginas a partir de las que se testa por rangos')
+    parser.add_argument('--workers', type=int, help='procesos del pool de rangos (por omisión, todos los núcleos)')
+    args = parser.parse_args(argv)
+
+    return 1 if check(args.corpus_dir, args.kinds, args.min_pages, args.workers) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
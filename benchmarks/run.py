@@ -0,0 +1,194 @@
+"""
+Harness de benchmarks: corre cada procesador sobre el corpus sintético.
+
+Cada procesador corre en un proceso nuevo (como un proceso del pool) para
+medir su pico de memoria por separado. Por documento se toman el tiempo total
+y la duración de cada etapa del pipeline (de las métricas del proceso); el
+resultado es un JSON con páginas/s, percentiles por etapa y pico de RSS que
+se puede comparar con el de otra corrida usando --baseline.
+"""
+
+import argparse
+
+import json
+
+import multiprocessing
+
+import os
+
+import platform
+
+import resource
+
+import sys
+
+import tempfile
+
+import time
+
+from collections import defaultdict
+
+from concurrent.futures import ProcessPoolExecutor
+
+from app.pdf.metrics import METRICS
+from app.pdf.processors import PROCESSORS, get_processor_class
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, q):
+    """ Percentil con interpolación lineal entre los valores ordenados. """
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(values):
+    summary = {'count': len(values), 'mean': sum(values) / len(values) if values else None}
+    for q in PERCENTILES:
+        summary[f'p{q}'] = percentile(values, q)
+    summary['max'] = max(values) if values else None
+    return summary
+
+
+def load_manifest(corpus_dir):
+    path = os.path.join(corpus_dir, 'manifest.json')
+    if not os.path.exists(path):
+        raise SystemExit(f"No existe {path}; genera el corpus con `python -m benchmarks.corpus {corpus_dir}`")
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['documents']
+
+
+def run_kind(kind, corpus_dir, documents, repeat, warmup):
+    """ Corre en un proceso aparte: procesa los documentos de un tipo y regresa sus mediciones. """
+    startup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    processor = get_processor_class(kind)()
+    stage_samples = defaultdict(list)
+    document_seconds = []
+    counters = defaultdict(float)
+    files = []
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as output_dir:
+        output_path = os.path.join(output_dir, 'salida.pdf')
+
+        # Una primera pasada descartada para no medir la generación de las marcas de agua ni cachés en frío
+        if warmup and documents:
+            smallest = min(documents, key=lambda doc: doc['pages'])
+            processor.ProcessPDF(os.path.join(corpus_dir, smallest['file']), output_path)
+        METRICS.drain()
+
+        for doc in documents:
+            pdf_path = os.path.join(corpus_dir, doc['file'])
+            for _ in range(repeat):
+                start = time.perf_counter()
+                processor.ProcessPDF(pdf_path, output_path)
+                seconds = time.perf_counter() - start
+
+                document_seconds.append(seconds)
+                files.append({'file': doc['file'], 'variant': doc['variant'], 'pages': doc['pages'],
+                              'seconds': seconds, 'pages_per_second': doc['pages'] / seconds})
+
+                doc_counters, histograms = METRICS.drain()
+                for (name, labels), (_, total, _) in histograms.items():
+                    if name == 'stage_seconds':
+                        stage_samples[dict(labels)['stage']].append(total)
+                for (name, labels), value in doc_counters.items():
+                    label = ','.join(f'{key}={value}' for key, value in labels if key != 'processor')
+                    counters[f'{name}{{{label}}}' if label else name] += value
+
+    pages = sum(item['pages'] for item in files)
+    seconds = sum(document_seconds)
+    return {
+        'processor': type(processor).__name__,
+        'documents': len(files),
+        'pages': pages,
+        'seconds': seconds,
+        'pages_per_second': pages / seconds if seconds else None,
+        'startup_rss_kb': startup_rss,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'document_seconds': summarize(document_seconds),
+        'stages': {stage: summarize(values) for stage, values in sorted(stage_samples.items())},
+        'counters': dict(sorted(counters.items())),
+        'files': files,
+    }
+
+
+def run_benchmarks(corpus_dir, kinds=None, max_pages=None, repeat=1, warmup=True):
+    documents = load_manifest(corpus_dir)
+    if max_pages:
+        documents = [doc for doc in documents if doc['pages'] <= max_pages]
+
+    import fitz
+
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pymupdf': fitz.VersionBind,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'corpus': os.path.abspath(corpus_dir),
+        'repeat': repeat,
+        'processors': {},
+    }
+
+    # spawn: cada procesador empieza con un intérprete limpio y su pico de memoria es solo suyo
+    context = multiprocessing.get_context('spawn')
+    for kind in kinds or PROCESSORS:
+        kind_documents = [doc for doc in documents if doc['kind'] == kind]
+        if not kind_documents:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_kind, kind, corpus_dir, kind_documents, repeat, warmup).result()
+        results['processors'][kind] = result
+        print(f"{kind:<10} {result['processor']:<26} {result['pages']:>6} páginas "
+              f"{result['pages_per_second']:>8.1f} pág/s  pico RSS {result['peak_rss_kb'] / 1024:.0f} MB")
+
+    pages = sum(result['pages'] for result in results['processors'].values())
+    seconds = sum(result['seconds'] for result in results['processors'].values())
+    results['total'] = {'pages': pages, 'seconds': seconds, 'pages_per_second': pages / seconds if seconds else None}
+    return results
+
+
+def compare(results, baseline):
+    """ Imprime el cambio de páginas/s y de la mediana por etapa contra una corrida anterior. """
+    print(f"\n{'':<10} {'antes':>10} {'ahora':>10} {'cambio':>8}")
+    for kind, result in results['processors'].items():
+        previous = baseline.get('processors', {}).get(kind)
+        if not previous:
+            continue
+        ratio = result['pages_per_second'] / previous['pages_per_second']
+        print(f"{kind:<10} {previous['pages_per_second']:>10.1f} {result['pages_per_second']:>10.1f} {ratio:>7.2f}x")
+        for stage, summary in result['stages'].items():
+            before = previous.get('stages', {}).get(stage)
+            if before and before['p50']:
+                print(f"  {stage:<18} p50 {before['p50'] * 1000:>9.2f} ms → {summary['p50'] * 1000:>9.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Corre los procesadores de testado sobre el corpus sintético.')
+    parser.add_argument('corpus_dir')
+    parser.add_argument('--output', default='benchmark.json', help='archivo JSON con los resultados')
+    parser.add_argument('--kinds', nargs='+', choices=list(PROCESSORS))
+    parser.add_argument('--max-pages', type=int, help='omite los documentos con más páginas')
+    parser.add_argument('--repeat', type=int, default=1, help='veces que se procesa cada documento')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false')
+    parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.corpus_dir, args.kinds, args.max_pages, args.repeat, args.warmup)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,4 +10,9 @@ def create_app_wrapper():
 app = create_app_wrapper()
 
 if __name__ == "__main__":
+    # Sin gunicorn no corren startup.warmup ni post_worker_init: el índice se reconcilia aquí
+    from app.pdf.routes import get_document_index, start_document_sync
+    get_document_index().sync()
+    with app.app_context():
+        start_document_sync()
     app.run(debug=True)
@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+# gunicorn lee este archivo solo desde la raíz del repositorio; las opciones de startup.txt
+# (--workers, --bind, --timeout) siguen funcionando y tienen prioridad sobre las de aquí
+import os
+
+workers = 4
+bind = '0.0.0.0'
+timeout = 600
+
+# El maestro importa la app una sola vez y los workers la heredan con fork (copy-on-write):
+# arrancan más rápido y las páginas de MuPDF, reportlab y las marcas no se duplican por worker
+preload_app = True
+
+
+def on_starting(server):
+    from app.pdf.startup import warmup, report
+    server.log.info(report(warmup(), 'Precarga del maestro'))
+
+
+def post_worker_init(worker):
+    from app.pdf.startup import rss_bytes
+    worker.log.info(f'Worker {os.getpid()} listo, RSS {rss_bytes() / 1024 ** 2:.1f} MB')
+
+    # La cola de trabajos arranca con el worker y no con la primera petición que la usa:
+    # así los trabajos pendientes (o de un worker que murió) corren aunque nadie mande otro.
+    # El índice de archivos se reconcilia en segundo plano, nunca dentro de una petición
+    from app.pdf.routes import get_job_queue, start_document_sync
+    with worker.wsgi.app_context():
+        get_job_queue()
+        start_document_sync()
@@ -1 +1,5 @@
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+
+BATCH_WORKERS = 1
+
+PAGE_PARALLEL_MIN_PAGES = 0
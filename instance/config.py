@@ -1 +1,55 @@
 DEBUG = True
+
+# Procesos para "Procesar Todos"; None usa todos los núcleos disponibles
+BATCH_WORKERS = None
+
+# Hilos por proceso de gunicorn que atienden la cola de trabajos en segundo plano
+JOB_WORKERS = 1
+
+# Cada cuántos segundos los hilos de la cola buscan trabajos pendientes (y los de procesos que murieron)
+JOB_POLL_SECONDS = 5
+
+# Caché en disco de PDFs testados (0 la desactiva)
+RESULT_CACHE_MAX_BYTES = 1024 ** 3
+
+# Archivos individuales con al menos estas páginas se testan por rangos en paralelo (0 lo desactiva)
+PAGE_PARALLEL_MIN_PAGES = 300
+
+# Procesos para el testado por rangos; None usa todos los núcleos disponibles
+PAGE_PARALLEL_WORKERS = None
+
+# Tamaño de cada parte en las subidas por partes y tamaño máximo de un archivo (None: sin límite)
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_MAX_BYTES = None
+
+# Hilos que extraen a disco las entradas de los ZIP de una carga masiva (la validación es secuencial)
+BULK_UPLOAD_WORKERS = 8
+
+# Máximo de archivos y de bytes descomprimidos de cada ZIP de una carga masiva (aunque UPLOAD_MAX_BYTES sea None)
+BULK_ZIP_MAX_ENTRIES = 5000
+BULK_ZIP_MAX_BYTES = 4 * 1024 ** 3
+
+# Archivos por página en los listados
+DOCUMENTS_PER_PAGE = 100
+
+# Cada cuántos segundos se revisa si la carpeta de cargas cambió por fuera de la app (archivos copiados
+# o borrados a mano) para reconciliar el índice; lo hace un solo worker por intervalo y en segundo plano
+DOCUMENT_SYNC_SECONDS = 60
+
+# Quitar los códigos QR de la última página de cada documento (etapa opcional del testado)
+DELETE_QR = False
+
+# Cómo se encuentran los QR: None por su posición en la última página; 'pyzbar' o 'qreader' decodifican
+# las imágenes candidatas de todas las páginas (el resultado de cada imagen se guarda en caché)
+QR_DETECTOR = None
+
+# Perfil con que se guardan los PDF testados: 'fast' (sin limpieza), 'compact' (recolecta, deduplica
+# y comprime objetos) o 'web' (además linealizado); las peticiones pueden pedir otro con `profile`
+SAVE_PROFILE = 'fast'
+BATCH_SAVE_PROFILE = 'compact'
+
+# Los PDF testados que pasan de este tamaño se escriben a un temporal en disco en lugar de quedarse en la
+# memoria del worker, y se mandan desde ahí con sendfile. OUTPUT_SPOOL_FOLDER None usa la carpeta temporal
+# del sistema; si es tmpfs (en RAM) conviene apuntarlo a un disco
+OUTPUT_SPOOL_BYTES = 16 * 1024 * 1024
+OUTPUT_SPOOL_FOLDER = None